@@ -48,7 +48,7 @@ def main():
     with st.expander("📂 View All Step Results (Summary)"):
         if st.session_state.raw_logs:
             st.markdown("### 1. Raw Logs")
-            st.text(f"Total Lines: {len(st.session_state.raw_logs)}")
+            st.text(f"Total Lines: {st.session_state.raw_logs.line_count}")
         
         if st.session_state.df_events is not None:
             st.markdown("### 2. Structured Data")
@@ -1,6 +1,7 @@
 """Models package for Project Stressed."""
 
 from .schema import StructuredLogEvent
+from .records import SessionBatch
 from .lstm_model import RCA_LSTM
 
-__all__ = ['StructuredLogEvent', 'RCA_LSTM']
+__all__ = ['StructuredLogEvent', 'SessionBatch', 'RCA_LSTM']
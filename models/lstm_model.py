@@ -5,6 +5,7 @@ Implements the Deep Learning component for sequence analysis.
 
 import torch
 import torch.nn as nn
+from torch.nn.utils.rnn import pack_padded_sequence
 
 
 class RCA_LSTM(nn.Module):
@@ -35,12 +36,15 @@ class RCA_LSTM(nn.Module):
         # Squashes the output between 0 and 1 (Probability).
         self.sigmoid = nn.Sigmoid()
 
-    def forward(self, x):
+    def forward(self, x, lengths=None):
         """
         Forward pass through the network.
         
         Args:
             x: Input tensor of shape (batch_size, sequence_length)
+            lengths: Optional tensor of the real (unpadded) length of each row.
+                     When given, the LSTM skips the padding and 'hidden' is the
+                     state after each sequence's last real event.
             
         Returns:
             Probability tensor of shape (batch_size, 1)
@@ -51,6 +55,11 @@ class RCA_LSTM(nn.Module):
         # 2. Run the LSTM over the sequence
         # 'out' is output at every step. 'hidden' is the state at the LAST step.
         # We only care about the final state (did the order finish?).
+        if lengths is not None:
+            # Packing lists only the real steps, so no computation is spent on
+            # <PAD> tokens (an empty row still takes one step: packing needs >= 1)
+            embedded = pack_padded_sequence(embedded, lengths.clamp(min=1).cpu(),
+                                            batch_first=True, enforce_sorted=False)
         _, (hidden, cell) = self.lstm(embedded)
         
         # 3. Take the last hidden state.
@@ -59,3 +68,29 @@ class RCA_LSTM(nn.Module):
         
         # 4. Produce prediction
         return self.sigmoid(self.fc(final_state))
+
+    def grow_embedding(self, vocab_size):
+        """
+        Enlarge the embedding table to vocab_size rows, keeping the learned rows.
+        New IDs (events first seen after training) get freshly initialized rows.
+        The weight stays the same Parameter object, so an optimizer holding it
+        keeps working (its per-row state must be grown too).
+        
+        Args:
+            vocab_size: New number of IDs
+            
+        Returns:
+            Number of rows added
+        """
+        old_size = self.embedding.num_embeddings
+        if vocab_size <= old_size:
+            return 0
+        weight = self.embedding.weight
+        new_rows = torch.empty(vocab_size - old_size, weight.shape[1], dtype=weight.dtype, device=weight.device)
+        nn.init.normal_(new_rows)
+        with torch.no_grad():
+            weight.data = torch.cat([weight.data, new_rows])
+        if weight.grad is not None:
+            weight.grad = None
+        self.embedding.num_embeddings = vocab_size
+        return vocab_size - old_size
@@ -0,0 +1,275 @@
+"""
+Compact event representations for Project Stressed.
+StructuredLogEvent (Pydantic) validates data at the API boundaries; inside the
+pipeline, events stay in the column arrays of LogParserAgent.parse_many and
+sessions in the SessionBatch below.
+"""
+
+import copy
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+
+# Per-event columns that point back at the original log line: either a
+# 'raw_log' copy or a (source_id, raw_offset, raw_length) reference
+PROVENANCE_COLUMNS = ('raw_log', 'source_id', 'raw_offset', 'raw_length')
+
+
+def pad_rows(values: np.ndarray, offsets: np.ndarray, rows: np.ndarray, max_len: int,
+             fill: int = 0) -> np.ndarray:
+    """
+    Scatter some rows of a CSR layout (flat values + offsets) into a
+    (len(rows), max_len) matrix: longer rows are truncated, shorter ones padded.
+
+    Args:
+        values: Flat per-event array
+        offsets: Row boundaries into values (length n + 1)
+        rows: Positions of the rows to include, in output order
+        max_len: Columns of the result
+        fill: Padding value
+
+    Returns:
+        2-D array, one line per selected row
+    """
+    starts = np.asarray(offsets[:-1][rows], dtype=np.int64)
+    kept = np.minimum(np.asarray(offsets[1:][rows], dtype=np.int64) - starts, max_len)
+    lines = np.repeat(np.arange(len(rows)), kept)
+    # Position of each kept event inside its row: 0, 1, 2, ... per row
+    cols = np.arange(kept.sum()) - np.repeat(np.cumsum(kept) - kept, kept)
+    matrix = np.full((len(rows), max_len), fill, dtype=values.dtype)
+    matrix[lines, cols] = values[np.repeat(starts, kept) + cols]
+    return matrix
+
+
+def _as_categorical(values) -> pd.Categorical:
+    return values if isinstance(values, pd.Categorical) else pd.Categorical(values)
+
+
+class SessionBatch:
+    """
+    Sessions (one per order) in CSR layout: the events of all orders sit in
+    flat arrays, grouped by order and time-ordered within each order, and
+    offsets[i]:offsets[i + 1] is the slice that belongs to order i.
+    - order_id: int64, one per session
+    - offsets: int64, len(sessions) + 1 entries
+    - event_code: small integer codes into 'dictionary' (flat)
+    - timestamp: int64 epoch seconds (flat)
+    - label: int8 per session, 1 = success
+    - provenance: flat provenance columns ('source_id', 'raw_offset', ...)
+    - encoded: flat vocabulary IDs, once the vocabulary has been applied
+
+    Per-order work (labels, last steps, padding) becomes a handful of NumPy
+    operations over the flat arrays instead of a Python loop over lists.
+    """
+
+    def __init__(self, order_id: np.ndarray, offsets: np.ndarray, event_code: np.ndarray,
+                 timestamp: np.ndarray, dictionary: Iterable[str], label: np.ndarray,
+                 provenance: Optional[Dict[str, np.ndarray]] = None, encoded: Optional[np.ndarray] = None):
+        self.order_id = np.asarray(order_id, dtype=np.int64)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.event_code = np.asarray(event_code)
+        self.timestamp = np.asarray(timestamp, dtype=np.int64)
+        self.dictionary = np.asarray(list(dictionary), dtype=object)
+        self.label = np.asarray(label, dtype=np.int8)
+        self.provenance = provenance or {}
+        self.encoded = encoded
+
+        if len(self.offsets) != len(self.order_id) + 1 or len(self.label) != len(self.order_id):
+            raise ValueError("SessionBatch needs one label per order and len(order_id) + 1 offsets.")
+        if len(self.timestamp) != len(self.event_code) or self.offsets[-1] != len(self.event_code):
+            raise ValueError("SessionBatch offsets must cover the flat event arrays exactly.")
+
+    @classmethod
+    def from_events(cls, order_id: np.ndarray, timestamp: np.ndarray, event_name,
+                    provenance: Optional[Dict[str, np.ndarray]] = None,
+                    success_event: str = "Screen_S14") -> 'SessionBatch':
+        """
+        Group flat, time-ordered events into one session per order.
+
+        Args:
+            order_id: Order ID of every event
+            timestamp: int64 epoch seconds of every event
+            event_name: Event names (a Categorical keeps its dictionary)
+            provenance: Flat provenance columns aligned with the events
+            success_event: Event that marks an order as successful (label 1)
+
+        Returns:
+            SessionBatch ordered by order_id; each order keeps its events' input order
+        """
+        events = _as_categorical(event_name.values if isinstance(event_name, pd.Series) else event_name)
+        dictionary = events.categories
+
+        # A stable sort brings each order's events together (still in time
+        # order), and 'starts' marks where each order begins
+        order_id = np.asarray(order_id)
+        perm = np.argsort(order_id, kind='stable')
+        sorted_ids = order_id[perm]
+        starts = np.flatnonzero(np.r_[True, sorted_ids[1:] != sorted_ids[:-1]]) if len(perm) else perm
+        codes = events.codes[perm]
+
+        # Success = the success event's code appears anywhere in the order
+        if success_event in dictionary and len(perm):
+            labels = np.logical_or.reduceat(codes == dictionary.get_loc(success_event), starts)
+        else:
+            labels = np.zeros(len(starts), dtype=bool)
+        provenance = {name: np.asarray(values)[perm] for name, values in (provenance or {}).items()}
+        return cls(sorted_ids[starts], np.append(starts, len(perm)), codes, np.asarray(timestamp)[perm],
+                   dictionary, labels, provenance)
+
+    @classmethod
+    def from_frame(cls, sessions: pd.DataFrame) -> 'SessionBatch':
+        """
+        Pack a sessions DataFrame with per-order lists ('event_name', and
+        optionally 'timestamp', 'encoded' and provenance) into the CSR layout.
+        A missing 'label' is derived from the Screen_S14 success event.
+        """
+        lengths = sessions['event_name'].map(len).to_numpy(dtype=np.int64)
+        offsets = np.concatenate(([0], np.cumsum(lengths)))
+
+        def flat(name: str, dtype=None) -> np.ndarray:
+            values = [v for seq in sessions[name] for v in seq]
+            return np.asarray(values, dtype=dtype) if dtype else np.asarray(values)
+
+        events = pd.Categorical(flat('event_name', object))
+        timestamp = flat('timestamp', np.int64) if 'timestamp' in sessions.columns else np.zeros(len(events), np.int64)
+        if 'label' in sessions.columns:
+            label = sessions['label'].to_numpy()
+        else:
+            label = sessions['event_name'].map(lambda seq: "Screen_S14" in seq).to_numpy()
+        provenance = {name: flat(name) for name in PROVENANCE_COLUMNS if name in sessions.columns}
+        encoded = flat('encoded', np.int64) if 'encoded' in sessions.columns else None
+        return cls(sessions['order_id'].to_numpy(), offsets, events.codes, timestamp,
+                   events.categories, label, provenance, encoded)
+
+    @classmethod
+    def concat(cls, batches: List['SessionBatch']) -> 'SessionBatch':
+        """
+        Join batches (e.g. shards) into one. Their dictionaries are merged and
+        the codes remapped; 'encoded' is kept when every batch has it (the IDs
+        must come from one shared vocabulary).
+        """
+        if not batches:
+            raise ValueError("SessionBatch.concat needs at least one batch.")
+        dictionary, index = [], {}
+        for batch in batches:
+            for name in batch.dictionary:
+                if name not in index:
+                    index[name] = len(dictionary)
+                    dictionary.append(name)
+
+        def remap(batch: 'SessionBatch') -> np.ndarray:
+            table = np.array([index[name] for name in batch.dictionary], dtype=np.int32)
+            return table[batch.event_code]
+
+        shifts = np.cumsum([0] + [len(batch.event_code) for batch in batches])
+        offsets = np.concatenate([batch.offsets[:-1] + shift for batch, shift in zip(batches, shifts)]
+                                 + [shifts[-1:]])
+        names = set.intersection(*(set(batch.provenance) for batch in batches))
+        provenance = {name: np.concatenate([batch.provenance[name] for batch in batches])
+                      for name in PROVENANCE_COLUMNS if name in names}
+        encoded = (np.concatenate([batch.encoded for batch in batches])
+                   if all(batch.encoded is not None for batch in batches) else None)
+        return cls(np.concatenate([batch.order_id for batch in batches]), offsets,
+                   np.concatenate([remap(batch) for batch in batches]),
+                   np.concatenate([batch.timestamp for batch in batches]), dictionary,
+                   np.concatenate([batch.label for batch in batches]), provenance, encoded)
+
+    def __len__(self) -> int:
+        return len(self.order_id)
+
+    @property
+    def lengths(self) -> np.ndarray:
+        """
+        Number of events in each session.
+        """
+        return np.diff(self.offsets)
+
+    def last_codes(self) -> np.ndarray:
+        """
+        Event code of the last event in every session (-1 for an empty one).
+        """
+        lengths = self.lengths
+        last = np.full(len(self), -1, dtype=np.int64)
+        has_events = lengths > 0
+        last[has_events] = self.event_code[self.offsets[1:][has_events] - 1]
+        return last
+
+    def pad(self, values: np.ndarray, max_len: int, fill: int = 0,
+            sessions: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Cut a flat per-event array into a (len(sessions), max_len) matrix:
+        longer sessions are truncated, shorter ones padded with 'fill'.
+
+        Args:
+            values: Flat array aligned with the events (e.g. 'encoded')
+            max_len: Columns of the result
+            fill: Padding value
+            sessions: Positions of the sessions to include, in row order (default: all)
+
+        Returns:
+            2-D array, one row per session
+        """
+        if sessions is None:
+            sessions = np.arange(len(self))
+        return pad_rows(values, self.offsets, sessions, max_len, fill)
+
+    def length_buckets(self, bucket_size: int, max_len: Optional[int] = None) -> List[np.ndarray]:
+        """
+        Group sessions of similar length: positions sorted by (truncated) length
+        and cut into buckets of bucket_size, so padding each bucket to its own
+        longest session wastes little.
+
+        Args:
+            bucket_size: Sessions per bucket
+            max_len: Truncation length, if any
+
+        Returns:
+            List of session position arrays, shortest sessions first
+        """
+        if bucket_size <= 0:
+            raise ValueError("bucket_size must be a positive integer.")
+        lengths = self.lengths if max_len is None else np.minimum(self.lengths, max_len)
+        order = np.argsort(lengths, kind='stable')
+        return [order[i:i + bucket_size] for i in range(0, len(order), bucket_size)]
+
+    def with_encoded(self, encoded: np.ndarray) -> 'SessionBatch':
+        """
+        Shallow copy of the batch with 'encoded' set; this batch is left as is
+        and the flat arrays are shared, not copied.
+        """
+        batch = copy.copy(self)
+        batch.encoded = encoded
+        return batch
+
+    def index_of(self, order_id: int) -> int:
+        """
+        Position of an order in the batch.
+        """
+        matches = np.flatnonzero(self.order_id == order_id)
+        if not len(matches):
+            raise KeyError(f"Order {order_id} is not in this session batch.")
+        return int(matches[0])
+
+    def session(self, i: int) -> Dict[str, object]:
+        """
+        One session as plain Python values (for display).
+        """
+        start, stop = self.offsets[i], self.offsets[i + 1]
+        row = {
+            'order_id': int(self.order_id[i]),
+            'event_name': self.dictionary[self.event_code[start:stop]].tolist(),
+            'timestamp': self.timestamp[start:stop].tolist(),
+            'label': int(self.label[i]),
+        }
+        for name, values in self.provenance.items():
+            row[name] = values[start:stop].tolist()
+        if self.encoded is not None:
+            row['encoded'] = self.encoded[start:stop].tolist()
+        return row
+
+    def head(self, n: int = 5) -> pd.DataFrame:
+        """
+        The first n sessions as a DataFrame of per-order lists (for previews).
+        """
+        return pd.DataFrame([self.session(i) for i in range(min(n, len(self)))])
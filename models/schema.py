@@ -3,17 +3,30 @@ Schema definitions for Project Stressed.
 Defines the Pydantic models that enforce strict typing.
 """
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, field_validator
 from typing import Optional
 
+from utils.timestamps import parse_timestamp
+
 
 class StructuredLogEvent(BaseModel):
     """
     This Pydantic model defines the 'Destination' for our parser.
     It enforces strict typing. If the parser finds an order_id, it MUST be an int.
     """
-    timestamp: str          # We keep as string for simplicity in demo, usually DateTime
+    timestamp: int          # Epoch seconds, parsed once at ingest (MISSING_TIMESTAMP if absent)
     event_name: str         # The most critical field: "UseCase_X" or "Screen_Y"
     order_id: Optional[int] # Optional because some system logs might not have an ID
     severity: str           # INFO, WARN, ERROR
     details: Optional[str]  # Catch-all for extra text
+
+    @field_validator('timestamp', mode='before')
+    @classmethod
+    def _parse_timestamp(cls, value):
+        # The parsers already pass epoch seconds; the log's "YYYY-MM-DD HH:MM:SS"
+        # text (e.g. from an LLM) is converted here
+        if type(value) is int:
+            return value
+        if value is None or isinstance(value, str):
+            return parse_timestamp(value)
+        return value
@@ -1,5 +1,11 @@
 """Parsers package for Project Stressed."""
 
 from .log_parser import LogParserAgent
+from .template_cache import TemplateCache
+from .drain import DrainLogParser, DrainTemplateMiner
+from .tiered import TieredLogParser, StructuredGenerationBackend, LocalStubBackend, OutlinesBackend
 
-__all__ = ['LogParserAgent']
+__all__ = [
+    'LogParserAgent', 'TemplateCache', 'DrainLogParser', 'DrainTemplateMiner',
+    'TieredLogParser', 'StructuredGenerationBackend', 'LocalStubBackend', 'OutlinesBackend',
+]
@@ -0,0 +1,314 @@
+"""
+Drain-style online template miner for Project Stressed.
+Learns log templates on the fly with a fixed-depth prefix tree, so new services
+can be parsed without writing new regex rules.
+
+Reference: He et al., "Drain: An Online Log Parsing Approach with Fixed Depth Tree" (ICWS 2017).
+"""
+
+import hashlib
+import json
+import os
+import re
+from typing import Dict, List, Optional, Tuple
+
+from parsers.log_parser import SEVERITY_PATTERN, TIMESTAMP_PATTERN, LogParserAgent
+
+# The wildcard token. Any position where lines of one template disagree becomes this.
+PARAM = '<*>'
+
+# Tokens that contain a digit (ids, timestamps, thread numbers) are variables.
+_HAS_DIGIT = re.compile(r'\d').search
+
+# The "[YYYY-MM-DD HH:MM:SS] [SEVERITY]" line header. Its fields are parsed
+# separately, and mining it would send every line down the <*> branch (the
+# date is the first token), so templates cover the message body only.
+_LINE_HEADER = re.compile(rf'(?:{TIMESTAMP_PATTERN.pattern}\s*)?(?:{SEVERITY_PATTERN.pattern}\s*)?')
+
+# 2: templates cover the message body, without the line header
+TEMPLATE_TABLE_VERSION = 2
+
+
+class LogCluster:
+    """
+    One learned template: the token list (with <*> holes), how many lines it
+    has absorbed, and the event name it maps to.
+    """
+    __slots__ = ('cluster_id', 'template_tokens', 'size', 'event_name')
+
+    def __init__(self, cluster_id: int, template_tokens: List[str], event_name: str, size: int = 1):
+        self.cluster_id = cluster_id
+        self.template_tokens = template_tokens
+        self.event_name = event_name
+        self.size = size
+
+    @property
+    def template(self) -> str:
+        return ' '.join(self.template_tokens)
+
+
+class _Node:
+    """
+    One level of the prefix tree. Internal nodes have children; leaves hold cluster ids.
+    """
+    __slots__ = ('children', 'cluster_ids')
+
+    def __init__(self):
+        self.children: Dict[object, '_Node'] = {}
+        self.cluster_ids: List[int] = []
+
+
+class DrainTemplateMiner:
+    """
+    The Drain algorithm in three moves:
+    1. Route by token count (lines of different length never share a template).
+    2. Route by the first (depth - 2) tokens. Digit-bearing tokens go down the <*> branch.
+    3. At the leaf, pick the most similar cluster. If it is similar enough, merge
+       (differing positions become <*>); otherwise start a new cluster.
+
+    Steps 1-2 are dict lookups, so the cost per line is O(depth), not O(#templates).
+    """
+
+    def __init__(self, depth: int = 4, sim_threshold: float = 0.4, max_children: int = 100):
+        if depth < 3:
+            raise ValueError("depth must be at least 3 (length layer + one token layer + leaf).")
+        self.depth = depth
+        self.sim_threshold = sim_threshold
+        self.max_children = max_children
+
+        self.root = _Node()
+        self.clusters: Dict[int, LogCluster] = {}
+
+    # --------------------------------------------------------------------------
+    # LEARNING & MATCHING
+    # --------------------------------------------------------------------------
+    def add_log_message(self, content: str) -> LogCluster:
+        """
+        Learn from one line: match it against the tree and either merge it into
+        an existing template or create a new one.
+
+        Args:
+            content: Raw log string
+
+        Returns:
+            The cluster the line now belongs to
+        """
+        tokens = content.split()
+        cluster = self._tree_search(tokens)
+
+        if cluster is None:
+            cluster_id = len(self.clusters) + 1
+            template = [PARAM if _HAS_DIGIT(token) else token for token in tokens]
+            cluster = LogCluster(cluster_id, template, event_name=f"Template_{cluster_id}")
+            self.clusters[cluster_id] = cluster
+            self._add_to_tree(cluster)
+        else:
+            cluster.size += 1
+            # Positions that disagree become wildcards
+            template = cluster.template_tokens
+            for i, token in enumerate(tokens):
+                if template[i] != token and template[i] != PARAM:
+                    template[i] = PARAM
+        return cluster
+
+    def match(self, content: str) -> Optional[LogCluster]:
+        """
+        Find the template for a line WITHOUT learning from it (read-only scoring).
+
+        Args:
+            content: Raw log string
+
+        Returns:
+            The matching cluster, or None if the line fits no known template
+        """
+        return self._tree_search(content.split())
+
+    def _tree_search(self, tokens: List[str]) -> Optional[LogCluster]:
+        node = self.root.children.get(len(tokens))
+        if node is None:
+            return None
+
+        # Walk the fixed-depth prefix: exact token first, then the wildcard branch
+        for token in tokens[:self.depth - 2]:
+            child = node.children.get(token)
+            if child is None:
+                child = node.children.get(PARAM)
+                if child is None:
+                    return None
+            node = child
+
+        return self._best_cluster(node.cluster_ids, tokens)
+
+    def _best_cluster(self, cluster_ids: List[int], tokens: List[str]) -> Optional[LogCluster]:
+        best, best_sim, best_params = None, -1.0, -1
+        for cluster_id in cluster_ids:
+            cluster = self.clusters[cluster_id]
+            sim, params = self._similarity(cluster.template_tokens, tokens)
+            # Ties go to the template with more wildcards (the more general one)
+            if sim > best_sim or (sim == best_sim and params > best_params):
+                best, best_sim, best_params = cluster, sim, params
+        if best is not None and best_sim >= self.sim_threshold:
+            return best
+        return None
+
+    @staticmethod
+    def _similarity(template: List[str], tokens: List[str]) -> Tuple[float, int]:
+        if not tokens:
+            return 1.0, 0
+        same, params = 0, 0
+        for t1, t2 in zip(template, tokens):
+            if t1 == PARAM:
+                params += 1
+            elif t1 == t2:
+                same += 1
+        return same / len(tokens), params
+
+    def _add_to_tree(self, cluster: LogCluster):
+        tokens = cluster.template_tokens
+        node = self.root.children.get(len(tokens))
+        if node is None:
+            node = self.root.children[len(tokens)] = _Node()
+
+        for token in tokens[:self.depth - 2]:
+            if token != PARAM and _HAS_DIGIT(token):
+                token = PARAM
+            child = node.children.get(token)
+            if child is None:
+                # Cap the fan-out: once a node is full, new tokens share the wildcard branch
+                if token != PARAM and len(node.children) >= self.max_children:
+                    token = PARAM
+                    child = node.children.get(PARAM)
+                if child is None:
+                    child = node.children[token] = _Node()
+            node = child
+
+        node.cluster_ids.append(cluster.cluster_id)
+
+    # --------------------------------------------------------------------------
+    # PERSISTENCE
+    # --------------------------------------------------------------------------
+    def save(self, path: str):
+        """
+        Write the template table to JSON so a restart does not have to re-learn.
+
+        Args:
+            path: Destination file
+        """
+        table = {
+            'version': TEMPLATE_TABLE_VERSION,
+            'depth': self.depth,
+            'sim_threshold': self.sim_threshold,
+            'max_children': self.max_children,
+            'clusters': [
+                {
+                    'cluster_id': c.cluster_id,
+                    'template': c.template_tokens,
+                    'size': c.size,
+                    'event_name': c.event_name,
+                }
+                for c in self.clusters.values()
+            ],
+        }
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(table, f, indent=2)
+        # Atomic replace: a crash mid-write never leaves a half-written table
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> 'DrainTemplateMiner':
+        """
+        Rebuild a miner (tree included) from a saved template table.
+
+        Args:
+            path: File written by save()
+
+        Returns:
+            DrainTemplateMiner with every template restored
+        """
+        with open(path, 'r', encoding='utf-8') as f:
+            table = json.load(f)
+        if table.get('version') != TEMPLATE_TABLE_VERSION:
+            raise ValueError(f"Unsupported template table version: {table.get('version')}")
+
+        miner = cls(depth=table['depth'], sim_threshold=table['sim_threshold'],
+                    max_children=table['max_children'])
+        for entry in sorted(table['clusters'], key=lambda e: e['cluster_id']):
+            cluster = LogCluster(entry['cluster_id'], list(entry['template']),
+                                 event_name=entry['event_name'], size=entry['size'])
+            miner.clusters[cluster.cluster_id] = cluster
+            miner._add_to_tree(cluster)
+        return miner
+
+
+class DrainLogParser(LogParserAgent):
+    """
+    A second parser backend. Timestamp, order id and severity come from the
+    usual fused extractors; lines whose event the UseCase_/Screen_ rules
+    cannot name are routed through the template miner instead of becoming
+    'UnknownEvent'. The template's event name (editable in the saved table)
+    becomes the event.
+    """
+
+    def __init__(self, template_path: Optional[str] = None, learn: bool = True,
+                 cache_size: Optional[int] = 4096, **miner_kwargs):
+        super().__init__(mode='fused', cache_size=cache_size)
+        self.template_path = template_path
+        # learn=False freezes the table: unmatched lines stay 'UnknownEvent'
+        self.learn = learn
+
+        if template_path and os.path.exists(template_path):
+            self.miner = DrainTemplateMiner.load(template_path)
+        else:
+            self.miner = DrainTemplateMiner(**miner_kwargs)
+
+    # Unknown events go through the str-based miner
+    bytes_native = False
+
+    @property
+    def parallel_safe(self) -> bool:
+        # Workers learning independently would hand out clashing template ids
+        return not self.learn
+
+    def cache_fingerprint(self) -> Optional[str]:
+        """
+        While learning, parsing grows the template table (a cached result would
+        skip that), so nothing is cacheable. A frozen table is part of the
+        fingerprint: renaming or adding a template changes it.
+        """
+        if self.learn:
+            return None
+        miner = self.miner
+        table = [(c.cluster_id, c.template, c.event_name) for c in sorted(miner.clusters.values(),
+                                                                      key=lambda c: c.cluster_id)]
+        digest = hashlib.blake2b(repr((miner.depth, miner.sim_threshold, miner.max_children, table)).encode(),
+                                 digest_size=16).hexdigest()
+        return f"{super().cache_fingerprint()}:templates={digest}"
+
+    def extract_fields(self, raw_text: str) -> Tuple[str, str, Optional[int], str]:
+        """
+        Pull (timestamp, event_name, order_id, severity) out of a line, naming
+        unknown events by their learned template.
+        """
+        timestamp, event_name, order_id, severity = super().extract_fields(raw_text)
+        if event_name == "UnknownEvent":
+            body = raw_text[_LINE_HEADER.match(raw_text).end():]
+            if self.learn:
+                cluster = self.miner.add_log_message(body)
+            else:
+                cluster = self.miner.match(body)
+            if cluster is not None:
+                event_name = cluster.event_name
+        return timestamp, event_name, order_id, severity
+
+    def save_templates(self, path: Optional[str] = None):
+        """
+        Persist the learned template table (defaults to the path it was loaded from).
+
+        Args:
+            path: Destination file (optional)
+        """
+        path = path or self.template_path
+        if not path:
+            raise ValueError("No template_path configured; pass a path to save_templates().")
+        self.miner.save(path)
@@ -4,38 +4,510 @@ Simulates LLM-based structured generation using regex heuristics.
 """
 
 import re
-from datetime import datetime
+import sys
+from typing import Dict, Iterable, List, Optional, Tuple
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
 from models.schema import StructuredLogEvent
+from parsers.template_cache import ExtractionPlan, TemplateCache, mask_template, mask_template_bytes
+from utils.timestamps import parse_timestamp, to_epoch
+
+
+# --------------------------------------------------------------------------
+# GENERAL PATH PATTERNS
+# Compiled once at import time instead of on every call to re.search.
+# --------------------------------------------------------------------------
+TIMESTAMP_PATTERN = re.compile(r'\[(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2})\]')
+EVENT_PATTERN = re.compile(r'(UseCase_\w+|Screen_\w+)')
+ORDER_PATTERN = re.compile(r'Order #?(\d+)|<Order>(\d+)|order_id\W+(\d+)')
+SEVERITY_PATTERN = re.compile(r'\[(INFO|WARN|ERROR)\]')
+
+# --------------------------------------------------------------------------
+# FORMAT-SPECIFIC PATTERNS (The "Fast Path")
+# Every line from utils/data_generator.py starts with the same header:
+#   [YYYY-MM-DD HH:MM:SS] [SEVERITY] [TAG] ...
+# The TAG tells us which of the known shapes follows, so one anchored match
+# pulls every field out in a single pass over the line.
+# --------------------------------------------------------------------------
+_HEADER = r'\[(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2})\] \[(INFO|WARN|ERROR)\] '
+
+FORMAT_PATTERNS = {
+    # Plain text: "[ts] [INFO] [Thread-3] User executing Screen_Login for Order #1000. Processing..."
+    'text': re.compile(_HEADER + r'\[Thread-\d+\] User executing (UseCase_\w+|Screen_\w+) for Order #?(\d+)'),
+    # XML: "[ts] [INFO] [Backend] TraceID: 912. Running Screen_Login. Payload: <Order>1000</Order>..."
+    'xml': re.compile(_HEADER + r'\[Backend\] TraceID: \d+\. Running (UseCase_\w+|Screen_\w+)\. Payload: <Order>(\d+)'),
+    # JSON: "[ts] [INFO] [API] Context: {'action': 'Screen_Login', 'order_id': 1000, ...}"
+    'json': re.compile(_HEADER + r"\[API\] Context: \{'action': '(UseCase_\w+|Screen_\w+)', 'order_id\W+(\d+)"),
+    # Crash marker: "[ts] [ERROR] [System] Order #1000 failed to transition. Logic Timeout."
+    'system': re.compile(_HEADER + r'\[System\] Order #?(\d+) failed to transition\. Logic Timeout\.$'),
+}
+
+# The cheap prefix check: the first three characters after the "] [" that
+# closes the severity tag identify the shape.
+_FORMAT_DISPATCH = {
+    'Thr': FORMAT_PATTERNS['text'],
+    'Bac': FORMAT_PATTERNS['xml'],
+    'API': FORMAT_PATTERNS['json'],
+    'Sys': FORMAT_PATTERNS['system'],
+}
+
+# --------------------------------------------------------------------------
+# BYTES PATTERNS (Memory-mapped ingestion)
+# The same patterns compiled for bytes, so they can run directly on an mmap
+# without decoding whole lines. All of them are pure ASCII.
+# --------------------------------------------------------------------------
+_BYTES_FORMAT_DISPATCH = {
+    prefix.encode(): re.compile(pattern.pattern.encode())
+    for prefix, pattern in _FORMAT_DISPATCH.items()
+}
+_BYTES_TIMESTAMP = re.compile(TIMESTAMP_PATTERN.pattern.encode())
+_BYTES_EVENT = re.compile(EVENT_PATTERN.pattern.encode())
+_BYTES_ORDER = re.compile(ORDER_PATTERN.pattern.encode())
+_BYTES_SEVERITY = re.compile(SEVERITY_PATTERN.pattern.encode())
+
+# parse_buffer splits the buffer into windows of about this many bytes, so the
+# transient per-line bytes objects and Python rows never exceed one window.
+BUFFER_WINDOW_BYTES = 8 * 1024 * 1024
+
+PARSER_MODES = ('regex', 'fused')
+
+
+def _line_aligned_windows(buffer, start: int, end: int):
+    """
+    Yield (start, end) byte windows of about BUFFER_WINDOW_BYTES that end on a newline.
+    """
+    while start < end:
+        cut = min(end, start + BUFFER_WINDOW_BYTES)
+        if cut < end:
+            newline = buffer.find(b'\n', cut - 1, end)
+            cut = end if newline < 0 else newline + 1
+        yield start, cut
+        start = cut
+
+
+def _concat_windows(parts: List[Dict[str, np.ndarray]]) -> Dict[str, np.ndarray]:
+    """
+    Join the per-window columns of parse_buffer (Categorical columns are
+    merged into one shared dictionary).
+    """
+    if len(parts) == 1:
+        return parts[0]
+    return {
+        name: union_categoricals([part[name] for part in parts]) if isinstance(values, pd.Categorical)
+        else np.concatenate([part[name] for part in parts])
+        for name, values in parts[0].items()
+    }
 
 
 class LogParserAgent:
     """
     In the real 'Project Stressed', this class wraps the 'outlines' library
     calling a local LLM (like Qwen2.5-Coder).
-    
-    Here, we simulate that intelligence using Regex heuristics so you can run 
+
+    Here, we simulate that intelligence using Regex heuristics so you can run
     this without a GPU.
+
+    Two modes are available:
+    - 'regex': the original four-search heuristic, kept for teaching.
+    - 'fused': dispatches each line to a per-format extractor that pulls all
+      fields in one anchored match, and only falls back to the general
+      search when the line does not fit a known shape. Output is identical.
+
+    In 'fused' mode an optional TemplateCache remembers where the fields sit
+    in each line shape, so repeated shapes are parsed by slicing alone.
     """
-    
+
+    # Output version: bump whenever a change alters what the parser extracts,
+    # so cached ETL results from older code are not reused.
+    version = 1
+    # Safe to copy into worker processes: the only state is a cache, and each
+    # worker can warm its own.
+    parallel_safe = True
+    # parse_buffer can run this parser's extraction directly on bytes.
+    # Subclasses with their own extract_fields set this to False.
+    bytes_native = True
+
+    def __init__(self, mode: str = 'fused', cache_size: Optional[int] = 4096):
+        if mode not in PARSER_MODES:
+            raise ValueError(f"Unknown parser mode '{mode}'. Expected one of {PARSER_MODES}.")
+        self.mode = mode
+        # cache_size=None (or mode='regex') disables the template cache
+        self.cache = TemplateCache(cache_size) if (cache_size and mode == 'fused') else None
+
+    def cache_fingerprint(self) -> Optional[str]:
+        """
+        Everything this parser's output depends on, for keying cached ETL
+        results. None means the output depends on state that parsing itself
+        changes or that lives outside the parser, so results must not be cached.
+        The template cache only speeds parsing up and is not part of it.
+        """
+        return f"{type(self).__module__}.{type(self).__qualname__}:v{self.version}:{self.mode}"
+
     def parse(self, raw_text: str) -> StructuredLogEvent:
         """
         Parse raw log text into a structured event.
-        
+
         Args:
             raw_text: Raw log string
-            
+
         Returns:
             StructuredLogEvent object with extracted fields
         """
+        if self.mode == 'regex':
+            return self._parse_regex(raw_text)
+
+        timestamp, event_name, order_id, severity = self.extract_fields(raw_text)
+        return StructuredLogEvent(
+            timestamp=parse_timestamp(timestamp),
+            event_name=event_name,
+            order_id=order_id,
+            severity=severity,
+            details="Mock Details"
+        )
+
+    def parse_many(self, lines: Iterable[str], strict: bool = False) -> Dict[str, np.ndarray]:
+        """
+        Parse a batch of lines into column arrays instead of one object per line.
+        This is what the ETL uses: million-line batches never touch Pydantic.
+
+        Args:
+            lines: Raw log strings
+            strict: If True, every row is also validated through StructuredLogEvent
+                    (slower, but raises on anything that breaks the schema)
+
+        Returns:
+            Dict of equal-length arrays:
+            - 'timestamp': int64 epoch seconds (MISSING_TIMESTAMP where none was found)
+            - 'event_name', 'severity': pd.Categorical (integer codes + a small
+              dictionary of distinct strings)
+            - 'order_id': int64 array (0 where no ID was found)
+            - 'order_id_null': bool array, True where no ID was found
+        """
+        if self.mode == 'regex' or strict:
+            extract = self._extract_validated
+        else:
+            extract = self.extract_fields
+
+        return self._columns_from_rows([extract(line) for line in lines])
+
+    @staticmethod
+    def _columns_from_rows(rows: List[Tuple[str, str, Optional[int], str]]) -> Dict[str, np.ndarray]:
+        """
+        Transpose extracted (timestamp, event_name, order_id, severity) rows
+        into the column arrays returned by parse_many.
+        """
+        if not rows:
+            return {
+                'timestamp': np.array([], dtype=np.int64),
+                'event_name': pd.Categorical([]),
+                'order_id': np.array([], dtype=np.int64),
+                'order_id_null': np.array([], dtype=bool),
+                'severity': pd.Categorical([]),
+            }
+
+        # Transpose rows -> columns in one C-level pass
+        timestamps, event_names, order_ids, severities = zip(*rows)
+        # Timestamps are converted here, once, with NumPy's fixed-format parser
+        timestamp = to_epoch(np.array(timestamps, dtype=object))
+        # Event names and severities have tiny cardinality: store them
+        # dictionary-encoded (codes + distinct strings) from here on.
+        # Interning first makes the hashing in the encoder cheap.
+        event_names = pd.Categorical(list(map(sys.intern, event_names)))
+        severities = pd.Categorical(list(map(sys.intern, severities)))
+        count = len(order_ids)
+        order_id_null = np.fromiter((o is None for o in order_ids), dtype=bool, count=count)
+        order_id = np.fromiter((0 if o is None else o for o in order_ids), dtype=np.int64, count=count)
+
+        return {
+            'timestamp': timestamp,
+            'event_name': event_names,
+            'order_id': order_id,
+            'order_id_null': order_id_null,
+            'severity': severities,
+        }
+
+    def parse_buffer(self, buffer, start: int = 0, end: Optional[int] = None,
+                     strict: bool = False) -> Dict[str, np.ndarray]:
+        """
+        Parse newline-separated log lines straight out of a bytes-like buffer
+        (typically an mmap). Lines are located by byte offset and the patterns
+        run on the buffer itself: only the extracted fields are ever decoded.
+
+        Args:
+            buffer: bytes, bytearray or mmap holding UTF-8 log lines
+            start: Byte offset to start at (must be the start of a line)
+            end: Byte offset to stop at (default: end of buffer)
+            strict: Validate every row through the Pydantic schema (slower)
+
+        Returns:
+            The parse_many columns plus 'raw_offset' and 'raw_length' (int64):
+            where each line lives in the buffer, instead of a copy of its text
+        """
+        end = len(buffer) if end is None else end
+        use_bytes = self.mode == 'fused' and self.bytes_native and not strict
+
+        # Each window becomes numpy columns right away, so the Python lists of
+        # rows and offsets never outgrow one window
+        parts = []
+        for window_start, window_end in _line_aligned_windows(buffer, start, end):
+            # One C-level split per window: short-lived bytes objects, never str
+            window = buffer[window_start:window_end].split(b'\n')
+            if window[-1] == b'':
+                window.pop()
+
+            rows, lines, offsets, lengths = [], [], [], []
+            pos = window_start
+            for line in window:
+                length = len(line)
+                offsets.append(pos)
+                pos += length + 1
+                # Drop the '\r' of Windows line endings
+                if line.endswith(b'\r'):
+                    line = line[:-1]
+                    length -= 1
+                lengths.append(length)
+
+                if not use_bytes:
+                    lines.append(line.decode('utf-8', errors='replace'))
+                elif not line.isascii():
+                    # bytes \d and \w are ASCII-only; UTF-8 text takes the str path
+                    rows.append(self.extract_fields(line.decode('utf-8', errors='replace')))
+                else:
+                    rows.append(self._extract_ascii_line(line))
+
+            # Parsers that cannot work on bytes get the decoded lines as one batch
+            columns = self._columns_from_rows(rows) if use_bytes else self.parse_many(lines, strict=strict)
+            columns['raw_offset'] = np.array(offsets, dtype=np.int64)
+            columns['raw_length'] = np.array(lengths, dtype=np.int64)
+            parts.append(columns)
+
+        if not parts:
+            columns = self._columns_from_rows([])
+            columns['raw_offset'] = np.array([], dtype=np.int64)
+            columns['raw_length'] = np.array([], dtype=np.int64)
+            return columns
+        return _concat_windows(parts)
+
+    def _extract_ascii_line(self, line: bytes) -> Tuple[str, str, Optional[int], str]:
+        """
+        Extract fields from one ASCII line held as bytes. For ASCII, byte
+        offsets equal character offsets, so the template cache (keyed on the
+        masked UTF-8 bytes) is shared with the str path.
+        """
+        if self.cache is None:
+            return self._extract_bytes(line, 0, len(line))
+
+        template = mask_template_bytes(line)
+        plan = self.cache.get(template)
+        if plan is None:
+            plan = self._locate_fields(line.decode('ascii'))
+            self.cache.put(template, plan)
+
+        ts_span, event_span, order_span, sev_span = plan
+        timestamp = line[ts_span[0]:ts_span[1]].decode('ascii') if ts_span else None
+        event_name = line[event_span[0]:event_span[1]].decode('ascii') if event_span else "UnknownEvent"
+        order_id = int(line[order_span[0]:order_span[1]]) if order_span else None
+        severity = line[sev_span[0]:sev_span[1]].decode('ascii') if sev_span else "INFO"
+        return timestamp, event_name, order_id, severity
+
+    @staticmethod
+    def _extract_bytes(buffer, pos: int, endpos: int) -> Tuple[str, str, Optional[int], str]:
+        """
+        The fast path and general path, run on one line of a bytes buffer.
+        Mirrors extract_fields field for field (ASCII lines only).
+        """
+        tag_start = buffer.find(b'] [', pos + 22, min(pos + 31, endpos))
+        if tag_start >= 0:
+            pattern = _BYTES_FORMAT_DISPATCH.get(buffer[tag_start + 3:tag_start + 6])
+            match = pattern.match(buffer, pos, endpos) if pattern is not None else None
+            if match is not None:
+                if match.lastindex == 3:
+                    timestamp, severity, order_id = match.groups()
+                    return timestamp.decode('ascii'), "UnknownEvent", int(order_id), severity.decode('ascii')
+                timestamp, severity, event_name, order_id = match.groups()
+                return (timestamp.decode('ascii'), event_name.decode('ascii'),
+                        int(order_id), severity.decode('ascii'))
+
+        ts_match = _BYTES_TIMESTAMP.search(buffer, pos, endpos)
+        timestamp = ts_match.group(1).decode('ascii') if ts_match else None
+
+        event_match = _BYTES_EVENT.search(buffer, pos, endpos)
+        event_name = event_match.group(1).decode('ascii') if event_match else "UnknownEvent"
+
+        order_match = _BYTES_ORDER.search(buffer, pos, endpos)
+        order_id = int(order_match.group(order_match.lastindex)) if order_match else None
+
+        sev_match = _BYTES_SEVERITY.search(buffer, pos, endpos)
+        severity = sev_match.group(1).decode('ascii') if sev_match else "INFO"
+
+        return timestamp, event_name, order_id, severity
+
+    def _extract_validated(self, raw_text: str) -> Tuple[str, str, Optional[int], str]:
+        """
+        STRICT PATH: Round-trip one line through the Pydantic model so the
+        schema is enforced, then hand back plain fields for the columns.
+        """
+        event = self.parse(raw_text)
+        return event.timestamp, event.event_name, event.order_id, event.severity
+
+    def extract_fields(self, raw_text: str) -> Tuple[str, str, Optional[int], str]:
+        """
+        Pull (timestamp, event_name, order_id, severity) out of a line.
+        Tries the per-format fast path first, then the general search.
+
+        Args:
+            raw_text: Raw log string
+
+        Returns:
+            Tuple of (timestamp, event_name, order_id, severity). The timestamp
+            is still the matched text (None if absent); parse_many turns the
+            whole column into epoch seconds in one pass.
+        """
+        if self.cache is not None:
+            template = mask_template(raw_text)
+            plan = self.cache.get(template)
+            if plan is None:
+                plan = self._locate_fields(raw_text)
+                self.cache.put(template, plan)
+            return self._apply_plan(raw_text, plan)
+
+        fields = self._extract_known_format(raw_text)
+        if fields is None:
+            fields = self._extract_general(raw_text)
+        return fields
+
+    def warm_cache(self, path: str, max_lines: Optional[int] = None) -> Dict[str, float]:
+        """
+        Pre-load the template cache from a sample log file, so the hot shapes
+        already take the fast path on the first real batch.
+
+        Args:
+            path: Path to a sample log file (one log line per line)
+            max_lines: Stop after this many lines (default: read the whole file)
+
+        Returns:
+            Cache statistics after warming
+        """
+        if self.cache is None:
+            raise RuntimeError("The template cache is disabled for this parser.")
+
+        with open(path, 'r', encoding='utf-8', errors='replace') as sample:
+            for i, line in enumerate(sample):
+                if max_lines is not None and i >= max_lines:
+                    break
+                line = line.rstrip('\r\n')
+                template = mask_template(line)
+                if self.cache.get(template) is None:
+                    self.cache.put(template, self._locate_fields(line))
+        return self.cache.stats()
+
+    def cache_stats(self) -> Dict[str, float]:
+        """
+        Returns the template cache counters (empty if the cache is disabled).
+        """
+        return self.cache.stats() if self.cache is not None else {}
+
+    def _locate_fields(self, raw_text: str) -> ExtractionPlan:
+        """
+        Find WHERE each field sits in the line (the extraction plan), using the
+        same fast path / general path order as extract_fields.
+        """
+        tag_start = raw_text.find('] [', 22, 31)
+        pattern = _FORMAT_DISPATCH.get(raw_text[tag_start + 3:tag_start + 6]) if tag_start >= 0 else None
+        match = pattern.match(raw_text) if pattern is not None else None
+        if match is not None:
+            if match.lastindex == 3:
+                # [System] crash marker: timestamp, severity, order id
+                return match.span(1), None, match.span(3), match.span(2)
+            return match.span(1), match.span(3), match.span(4), match.span(2)
+
+        ts_match = TIMESTAMP_PATTERN.search(raw_text)
+        event_match = EVENT_PATTERN.search(raw_text)
+        order_match = ORDER_PATTERN.search(raw_text)
+        sev_match = SEVERITY_PATTERN.search(raw_text)
+        return (
+            ts_match.span(1) if ts_match else None,
+            event_match.span(1) if event_match else None,
+            order_match.span(order_match.lastindex) if order_match else None,
+            sev_match.span(1) if sev_match else None,
+        )
+
+    @staticmethod
+    def _apply_plan(raw_text: str, plan: ExtractionPlan) -> Tuple[str, str, Optional[int], str]:
+        """
+        Slice the fields out of a line using a cached plan. Missing fields get
+        the same defaults as the general path.
+        """
+        ts_span, event_span, order_span, sev_span = plan
+        timestamp = raw_text[ts_span[0]:ts_span[1]] if ts_span else None
+        event_name = raw_text[event_span[0]:event_span[1]] if event_span else "UnknownEvent"
+        order_id = int(raw_text[order_span[0]:order_span[1]]) if order_span else None
+        severity = raw_text[sev_span[0]:sev_span[1]] if sev_span else "INFO"
+        return timestamp, event_name, order_id, severity
+
+    def _extract_known_format(self, raw_text: str) -> Optional[Tuple[str, str, Optional[int], str]]:
+        """
+        FAST PATH: Identify the log shape from the tag after the header and
+        run that shape's single anchored pattern. Returns None on any mismatch.
+        """
+        # The header "[YYYY-MM-DD HH:MM:SS] [" is 23 chars; the severity tag
+        # ends at the next "] [" (INFO/WARN are 4 chars, ERROR is 5).
+        tag_start = raw_text.find('] [', 22, 31)
+        if tag_start < 0:
+            return None
+        pattern = _FORMAT_DISPATCH.get(raw_text[tag_start + 3:tag_start + 6])
+        if pattern is None:
+            return None
+        match = pattern.match(raw_text)
+        if match is None:
+            return None
+
+        groups = match.groups()
+        if len(groups) == 3:
+            # The [System] crash marker carries no event name
+            timestamp, severity, order_id = groups
+            return timestamp, "UnknownEvent", int(order_id), severity
+        timestamp, severity, event_name, order_id = groups
+        return timestamp, event_name, int(order_id), severity
+
+    def _extract_general(self, raw_text: str) -> Tuple[str, str, Optional[int], str]:
+        """
+        GENERAL PATH: The original heuristic, using the precompiled patterns.
+        Handles any line shape the fast path does not recognise.
+        """
+        ts_match = TIMESTAMP_PATTERN.search(raw_text)
+        timestamp = ts_match.group(1) if ts_match else None
+
+        event_match = EVENT_PATTERN.search(raw_text)
+        event_name = event_match.group(1) if event_match else "UnknownEvent"
+
+        order_match = ORDER_PATTERN.search(raw_text)
+        if order_match:
+            # lastindex is the number of the group that actually captured
+            order_id = int(order_match.group(order_match.lastindex))
+        else:
+            order_id = None
+
+        sev_match = SEVERITY_PATTERN.search(raw_text)
+        severity = sev_match.group(1) if sev_match else "INFO"
+
+        return timestamp, event_name, order_id, severity
+
+    def _parse_regex(self, raw_text: str) -> StructuredLogEvent:
+        """
+        The original four-search heuristic (mode='regex').
+        """
         # 1. Extract Timestamp: Look for [YYYY-MM-DD HH:MM:SS]
         ts_match = re.search(r'\[(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2})\]', raw_text)
-        timestamp = ts_match.group(1) if ts_match else datetime.now().isoformat()
-        
+        # Epoch seconds, converted once here (no timestamp -> MISSING_TIMESTAMP)
+        timestamp = parse_timestamp(ts_match.group(1) if ts_match else None)
+
         # 2. Extract Event Name: Look for UseCase_... or Screen_...
         # This is the "Buried Event" logic. The Regex ignores surrounding text.
         event_match = re.search(r'(UseCase_\w+|Screen_\w+)', raw_text)
         event_name = event_match.group(1) if event_match else "UnknownEvent"
-        
+
         # 3. Extract Order ID: Look for "Order #123" or "Order>123" or "order_id': 123"
         order_match = re.search(r'Order #?(\d+)|<Order>(\d+)|order_id\W+(\d+)', raw_text)
         # Regex groups logic: find which group captured the digits
@@ -44,16 +516,16 @@ class LogParserAgent:
             order_id = int(next(g for g in order_match.groups() if g is not None))
         else:
             order_id = None
-        
+
         # 4. Extract Severity
         sev_match = re.search(r'\[(INFO|WARN|ERROR)\]', raw_text)
         severity = sev_match.group(1) if sev_match else "INFO"
-        
+
         # Return the strictly typed object
         return StructuredLogEvent(
-            timestamp=timestamp, 
-            event_name=event_name, 
-            order_id=order_id, 
-            severity=severity, 
+            timestamp=timestamp,
+            event_name=event_name,
+            order_id=order_id,
+            severity=severity,
             details="Mock Details"
         )
@@ -0,0 +1,127 @@
+"""
+Template-keyed parse cache for Project Stressed.
+Remembers WHERE the fields sit in each log shape, so repeated shapes skip the search.
+"""
+
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+# A "plan" is the location of each field inside a line, as (start, end) spans:
+# (timestamp_span, event_span, order_span, severity_span).
+# None means "this shape has no such field" -> the parser's default applies.
+Span = Optional[Tuple[int, int]]
+ExtractionPlan = Tuple[Span, Span, Span, Span]
+
+# Every ASCII digit becomes '0'. All parser patterns treat digits only as \d or \w,
+# so two lines with the same template match at exactly the same offsets.
+# "Order #1042 at [2024-01-01 10:00:00]" -> b"Order #0000 at [0000-00-00 00:00:00]"
+# The masking runs on UTF-8 bytes: bytes.translate is a flat 256-entry table
+# lookup in C, roughly 10x faster than str.translate with a dict.
+_DIGIT_MASK = bytes.maketrans(b'0123456789', b'0000000000')
+
+
+def mask_template(raw_text: str) -> bytes:
+    """
+    Build the cache key for a line: the line with ids, timestamps and other numbers masked.
+
+    Args:
+        raw_text: Raw log string
+
+    Returns:
+        Masked template (UTF-8 bytes)
+    """
+    return raw_text.encode('utf-8', 'surrogatepass').translate(_DIGIT_MASK)
+
+
+def mask_template_bytes(raw_line: bytes) -> bytes:
+    """
+    Same key as mask_template, for a line that is still UTF-8 bytes
+    (memory-mapped ingestion), without decoding it first.
+
+    Args:
+        raw_line: Raw log line as bytes
+
+    Returns:
+        Masked template (UTF-8 bytes)
+    """
+    return raw_line.translate(_DIGIT_MASK)
+
+
+class TemplateCache:
+    """
+    A bounded LRU map from masked template -> extraction plan.
+
+    Production logs repeat a handful of shapes and only differ in ids and times.
+    A hit turns parsing into four string slices; a miss costs one full search.
+    High-cardinality noise cannot grow memory: the least recently used
+    template is evicted once max_size is reached.
+    """
+
+    def __init__(self, max_size: int = 4096):
+        if max_size <= 0:
+            raise ValueError("max_size must be a positive integer.")
+        self.max_size = max_size
+        self._plans: "OrderedDict[bytes, ExtractionPlan]" = OrderedDict()
+
+        # Counters (The Transparency Layer)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._plans)
+
+    def get(self, template: bytes) -> Optional[ExtractionPlan]:
+        """
+        Look up a plan and mark it as recently used.
+
+        Args:
+            template: Masked template (see mask_template)
+
+        Returns:
+            The cached plan, or None on a miss
+        """
+        plan = self._plans.get(template)
+        if plan is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._plans.move_to_end(template)
+        return plan
+
+    def put(self, template: bytes, plan: ExtractionPlan):
+        """
+        Store a plan, evicting the least recently used template if full.
+
+        Args:
+            template: Masked template (see mask_template)
+            plan: Field spans for this shape
+        """
+        self._plans[template] = plan
+        self._plans.move_to_end(template)
+        if len(self._plans) > self.max_size:
+            self._plans.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        """
+        Drop every plan and reset the counters.
+        """
+        self._plans.clear()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def stats(self) -> Dict[str, float]:
+        """
+        Returns hit/miss counters and the current fill level.
+        """
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self._plans),
+            'max_size': self.max_size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+        }
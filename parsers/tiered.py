@@ -0,0 +1,275 @@
+"""
+Tiered parsing for Project Stressed.
+Regex/template extraction handles the bulk of the traffic; only the lines it
+cannot understand are sent to a (slow) structured-generation backend such as
+an LLM driven by the 'outlines' library.
+"""
+
+import re
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+import numpy as np
+
+from models.schema import StructuredLogEvent
+from parsers.log_parser import FORMAT_PATTERNS, LogParserAgent
+from parsers.template_cache import TemplateCache, mask_template
+from utils.timestamps import format_timestamp
+
+# An answer plan is like a TemplateCache extraction plan, except that the
+# slow tier may return values that are not literally in the line (e.g. a
+# normalised event name). Each field is a (start, end) span into the line,
+# a literal string, or None ("unknown, keep what the fast tier found").
+AnswerField = Union[Tuple[int, int], str, None]
+AnswerPlan = Tuple[AnswerField, AnswerField, AnswerField, AnswerField]
+
+# "[ts] [ERROR] [System] Order #N failed to transition. ...": fully parsed by tier 1
+_CRASH_MARKER = FORMAT_PATTERNS['system']
+
+
+class StructuredGenerationBackend(ABC):
+    """
+    Interface for the slow tier. Implementations receive a micro-batch of raw
+    lines and must return one StructuredLogEvent per line, in the same order.
+    """
+
+    @abstractmethod
+    def generate_batch(self, lines: List[str]) -> List[StructuredLogEvent]:
+        ...
+
+
+class LocalStubBackend(StructuredGenerationBackend):
+    """
+    A local stand-in for an LLM server, for tests and demos without a GPU.
+    Sleeps 'latency' seconds per batch (plus 'per_line_latency' per line),
+    then answers with the general regex heuristic.
+    """
+
+    def __init__(self, latency: float = 0.05, per_line_latency: float = 0.0):
+        self.latency = latency
+        self.per_line_latency = per_line_latency
+        self._heuristic = LogParserAgent(mode='fused', cache_size=None)
+
+        self.calls = 0
+        self.lines_seen = 0
+
+    def generate_batch(self, lines: List[str]) -> List[StructuredLogEvent]:
+        self.calls += 1
+        self.lines_seen += len(lines)
+        time.sleep(self.latency + self.per_line_latency * len(lines))
+
+        results = []
+        for line in lines:
+            timestamp, event_name, order_id, severity = self._heuristic._extract_general(line)
+            results.append(StructuredLogEvent(
+                timestamp=timestamp,
+                event_name=event_name,
+                order_id=order_id,
+                severity=severity,
+                details=line
+            ))
+        return results
+
+
+class OutlinesBackend(StructuredGenerationBackend):
+    """
+    The production slow tier: a local LLM (e.g. Qwen2.5-Coder) constrained by
+    'outlines' to emit JSON that matches StructuredLogEvent.
+
+    Requires the optional 'outlines' dependency (see requirements.txt).
+    """
+
+    PROMPT = (
+        "Extract the structured event from this application log line. "
+        "Use the exact timestamp, order id and severity found in the line.\n"
+        "Log: {line}\n"
+    )
+
+    def __init__(self, model_name: str = "Qwen/Qwen2.5-Coder-1.5B-Instruct"):
+        try:
+            import outlines
+        except ImportError as exc:
+            raise ImportError(
+                "OutlinesBackend needs the 'outlines' package. "
+                "Uncomment it in requirements.txt and reinstall."
+            ) from exc
+
+        self.model = outlines.models.transformers(model_name)
+        self.generator = outlines.generate.json(self.model, StructuredLogEvent)
+
+    def generate_batch(self, lines: List[str]) -> List[StructuredLogEvent]:
+        # outlines generators accept a list of prompts and decode them as one batch
+        return self.generator([self.PROMPT.format(line=line) for line in lines])
+
+
+class TieredLogParser(LogParserAgent):
+    """
+    Two-tier parser:
+    - Tier 1 (fast): the regex/template parser handles every line it can.
+    - Tier 2 (slow): misses (no event name) are grouped by
+      masked template, so each new line SHAPE is sent once. Unique shapes are
+      sent in micro-batches, several batches in flight at a time, and the
+      answer is cached as a plan that applies to every line of that shape.
+    """
+
+    # The answer cache and the backend connection belong in one process
+    parallel_safe = False
+    bytes_native = False
+
+    def __init__(self, backend: StructuredGenerationBackend, fast_parser: Optional[LogParserAgent] = None,
+                 batch_size: int = 16, max_in_flight: int = 4, cache_size: int = 4096):
+        super().__init__(mode='fused', cache_size=None)
+        self.backend = backend
+        self.fast_parser = fast_parser if fast_parser is not None else LogParserAgent()
+        self.batch_size = batch_size
+        self.max_in_flight = max_in_flight
+        # Template -> AnswerPlan, so the slow tier is asked about a shape only once
+        self.answers = TemplateCache(cache_size)
+
+        # Counters (The Transparency Layer)
+        self.lines_total = 0
+        self.lines_slow_tier = 0
+        self.templates_sent = 0
+        self.backend_batches = 0
+
+    def cache_fingerprint(self) -> Optional[str]:
+        """
+        The slow tier's answers come from an external backend (and fill the
+        answer cache as a side effect), so tiered results are never cached.
+        """
+        return None
+
+    # --------------------------------------------------------------------------
+    # PARSING
+    # --------------------------------------------------------------------------
+    def extract_fields(self, raw_text: str) -> Tuple[str, str, Optional[int], str]:
+        """
+        Single-line version of the tiered lookup (a miss is sent as a batch of one).
+        """
+        return self._extract_tiered([raw_text])[0]
+
+    def parse_many(self, lines: Iterable[str], strict: bool = False) -> Dict[str, np.ndarray]:
+        """
+        Parse a batch, sending only the unresolved line shapes to the slow tier.
+        Same column layout as LogParserAgent.parse_many.
+        """
+        rows = self._extract_tiered(lines if isinstance(lines, list) else list(lines))
+        if strict:
+            for timestamp, event_name, order_id, severity in rows:
+                StructuredLogEvent(timestamp=timestamp, event_name=event_name,
+                                   order_id=order_id, severity=severity, details="Mock Details")
+        return self._columns_from_rows(rows)
+
+    def _extract_tiered(self, lines: List[str]) -> List[Tuple[str, str, Optional[int], str]]:
+        # 1. Tier 1 on everything
+        rows = [self.fast_parser.extract_fields(line) for line in lines]
+        self.lines_total += len(rows)
+
+        # 2. Group the misses by template (dedup)
+        misses: Dict[bytes, List[int]] = {}
+        for i, (_, event_name, _, _) in enumerate(rows):
+            # Crash markers are a known shape whose event is UnknownEvent by design
+            if event_name == "UnknownEvent" and not _CRASH_MARKER.match(lines[i]):
+                misses.setdefault(mask_template(lines[i]), []).append(i)
+        if not misses:
+            return rows
+        self.lines_slow_tier += sum(len(idx) for idx in misses.values())
+
+        # 3. Shapes we have never asked about go to the backend
+        plans: Dict[bytes, AnswerPlan] = {}
+        pending = []
+        for template in misses:
+            plan = self.answers.get(template)
+            if plan is None:
+                pending.append(template)
+            else:
+                plans[template] = plan
+        if pending:
+            plans.update(self._ask_backend(pending, misses, lines))
+
+        # 4. Apply each shape's answer to every line of that shape
+        for template, indices in misses.items():
+            plan = plans[template]
+            for i in indices:
+                rows[i] = self._apply_answer(lines[i], plan, rows[i])
+        return rows
+
+    def _ask_backend(self, templates: List[bytes], misses: Dict[bytes, List[int]],
+                     lines: List[str]) -> Dict[bytes, AnswerPlan]:
+        """
+        Send one representative line per template, in micro-batches that are
+        in flight concurrently, and cache the resulting plans.
+        """
+        batches = [templates[i:i + self.batch_size] for i in range(0, len(templates), self.batch_size)]
+        plans = {}
+        with ThreadPoolExecutor(max_workers=self.max_in_flight) as pool:
+            futures = [
+                (batch, pool.submit(self.backend.generate_batch, [lines[misses[t][0]] for t in batch]))
+                for batch in batches
+            ]
+            for batch, future in futures:
+                answers = future.result()
+                self.backend_batches += 1
+                for template, answer in zip(batch, answers):
+                    plan = self._answer_to_plan(lines[misses[template][0]], answer)
+                    self.answers.put(template, plan)
+                    plans[template] = plan
+        self.templates_sent += len(templates)
+        return plans
+
+    @staticmethod
+    def _answer_to_plan(line: str, answer: StructuredLogEvent) -> AnswerPlan:
+        """
+        Turn the backend's answer for ONE line into offsets that work for every
+        line of the same template (values are located in the representative line).
+        """
+        def locate(value: Optional[str], numeric: bool = False) -> Optional[Tuple[int, int]]:
+            if not value:
+                return None
+            if numeric:
+                match = re.search(r'(?<!\d)' + re.escape(value) + r'(?!\d)', line)
+                return match.span() if match else None
+            start = line.find(value)
+            return (start, start + len(value)) if start >= 0 else None
+
+        # The schema holds epoch seconds; look for them in the line's own format
+        ts_plan = locate(format_timestamp(answer.timestamp))
+        # A value the model normalised (not present in the line) is kept as a literal
+        event_plan = locate(answer.event_name) or answer.event_name
+        order_plan = locate(str(answer.order_id), numeric=True) if answer.order_id is not None else None
+        sev_plan = locate(answer.severity) or answer.severity
+        return ts_plan, event_plan, order_plan, sev_plan
+
+    @staticmethod
+    def _apply_answer(line: str, plan: AnswerPlan,
+                      fast_row: Tuple[str, str, Optional[int], str]) -> Tuple[str, str, Optional[int], str]:
+        def resolve(field: AnswerField, fallback):
+            if field is None:
+                return fallback
+            if isinstance(field, tuple):
+                return line[field[0]:field[1]]
+            return field
+
+        timestamp, event_name, order_id, severity = fast_row
+        order_text = resolve(plan[2], None)
+        return (
+            resolve(plan[0], timestamp),
+            resolve(plan[1], event_name),
+            int(order_text) if order_text is not None else order_id,
+            resolve(plan[3], severity),
+        )
+
+    def tier_stats(self) -> Dict[str, float]:
+        """
+        Returns how much traffic reached the slow tier and how often it was called.
+        """
+        return {
+            'lines_total': self.lines_total,
+            'lines_slow_tier': self.lines_slow_tier,
+            'slow_tier_fraction': round(self.lines_slow_tier / self.lines_total, 4) if self.lines_total else 0.0,
+            'templates_sent': self.templates_sent,
+            'backend_batches': self.backend_batches,
+            'answer_cache_hits': self.answers.hits,
+        }
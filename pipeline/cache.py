@@ -0,0 +1,185 @@
+"""
+Stage artifact cache for Project Stressed.
+Stores the output of a pipeline stage on local disk under a key derived from
+the stage's inputs, code version and parameters, so re-running a stage on the
+same input loads its result instead of recomputing it.
+"""
+
+import hashlib
+import os
+import pickle
+import tempfile
+from typing import Any, Iterable, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from models.records import PROVENANCE_COLUMNS, SessionBatch
+from utils.log_sources import LogBuffer
+
+# Part of every key: bump when the stored layout of stage outputs changes
+CACHE_FORMAT = 1
+DEFAULT_CACHE_BYTES = 2 * 1024 ** 3
+_SUFFIX = '.pkl'
+
+
+def _update_array(h, values: np.ndarray):
+    values = np.asarray(values)
+    h.update(str(values.dtype).encode())
+    h.update(str(values.shape).encode())
+    if values.dtype == object:
+        # Strings and other objects: hash their values, not their addresses
+        h.update(pd.util.hash_array(values.astype(str)).tobytes())
+    else:
+        h.update(np.ascontiguousarray(values).data)
+
+
+def content_digest(value: Any) -> Optional[str]:
+    """
+    Hash of a stage input's content.
+
+    Args:
+        value: LogBuffer / MappedLogFile, list of log lines, events DataFrame
+               or SessionBatch
+
+    Returns:
+        Hex digest, or None for a type that cannot be hashed (not cacheable)
+    """
+    h = hashlib.blake2b(digest_size=16)
+    if isinstance(value, LogBuffer):
+        h.update(b'logs')
+        h.update(value.buffer)
+    elif isinstance(value, list) and all(isinstance(line, str) for line in value):
+        # Same bytes as LogBuffer.from_lines, so a list and its packed buffer agree
+        h.update(b'logs')
+        h.update('\n'.join(value).encode('utf-8', errors='replace'))
+    elif isinstance(value, pd.DataFrame):
+        h.update(b'frame')
+        h.update(repr(list(zip(value.columns, map(str, value.dtypes)))).encode())
+        h.update(pd.util.hash_pandas_object(value, index=True).values.tobytes())
+    elif isinstance(value, SessionBatch):
+        h.update(b'sessions')
+        for values in (value.order_id, value.offsets, value.event_code, value.timestamp,
+                       value.label, value.dictionary):
+            _update_array(h, values)
+        for name in PROVENANCE_COLUMNS:
+            if name in value.provenance:
+                h.update(name.encode())
+                _update_array(h, value.provenance[name])
+        if value.encoded is not None:
+            _update_array(h, value.encoded)
+    else:
+        return None
+    return h.hexdigest()
+
+
+class StageCache:
+    """
+    On-disk, content-addressed cache of stage outputs.
+
+    Each entry is one pickle file named by its key. Reading an entry touches
+    its modification time, and writing one evicts the least recently used
+    entries until the directory fits in max_bytes.
+    """
+
+    def __init__(self, directory: str, max_bytes: int = DEFAULT_CACHE_BYTES):
+        if max_bytes <= 0:
+            raise ValueError("max_bytes must be a positive number of bytes.")
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def key(stage: str, inputs: Iterable[str], **params) -> str:
+        """
+        Cache key of one stage run.
+
+        Args:
+            stage: Stage name
+            inputs: Digests of the stage's inputs
+            **params: Everything else the output depends on (code versions,
+                      options, vocabulary fingerprint, ...)
+
+        Returns:
+            Hex key
+        """
+        h = hashlib.blake2b(digest_size=20)
+        h.update(repr((CACHE_FORMAT, stage, tuple(inputs), sorted(params.items()))).encode())
+        return h.hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key + _SUFFIX)
+
+    def get(self, key: str) -> Tuple[bool, Any]:
+        """
+        Look up an entry.
+
+        Returns:
+            (hit, value); value is None on a miss
+        """
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                value = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            self.misses += 1
+            return False, None
+        os.utime(path)
+        self.hits += 1
+        return True, value
+
+    def put(self, key: str, value: Any):
+        """
+        Store an entry (written to a temporary file, then renamed into place),
+        then evict old entries if the cache is over its size cap.
+        """
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, self._path(key))
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+        self.evict(keep=key)
+
+    def entries(self):
+        """
+        (path, size, last access) of every entry, least recently used first.
+        """
+        found = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(_SUFFIX):
+                stat = entry.stat()
+                found.append((entry.path, stat.st_size, stat.st_mtime))
+        return sorted(found, key=lambda item: item[2])
+
+    @property
+    def size(self) -> int:
+        return sum(size for _, size, _ in self.entries())
+
+    def evict(self, keep: Optional[str] = None):
+        """
+        Remove least recently used entries until the cache fits in max_bytes.
+        The entry named by keep (the one just written) is never removed.
+        """
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        keep_path = self._path(keep) if keep else None
+        for path, size, _ in entries:
+            if total <= self.max_bytes:
+                break
+            if path == keep_path:
+                continue
+            os.remove(path)
+            total -= size
+
+    def clear(self):
+        """
+        Remove every entry.
+        """
+        for path, _, _ in self.entries():
+            os.remove(path)
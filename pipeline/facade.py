@@ -1,7 +1,31 @@
-from typing import List, Dict, Any
+import weakref
+from typing import List, Dict, Any, Callable, Iterator, Optional, Union
+import numpy as np
 import pandas as pd
+from models.records import SessionBatch
+from pipeline.cache import DEFAULT_CACHE_BYTES, StageCache, content_digest
 from pipeline.orchestrator import ProjectStressedPipeline
+from pipeline.sessionizer import StreamingSessionizer
+from parsers.log_parser import LogParserAgent
 from utils.data_generator import generate_messy_logs
+from utils.log_sources import LogBuffer
+
+def _adopt_source(sessions: SessionBatch, events: Union[pd.DataFrame, SessionBatch]):
+    """
+    Point a stored SessionBatch's provenance at the log source of the input it
+    was looked up for (source ids are per run). Inputs from several sources
+    are keyed on their source ids already, so only a single source is adopted.
+    """
+    if isinstance(events, pd.DataFrame):
+        ids = events['source_id'].to_numpy() if 'source_id' in events else None
+    else:
+        ids = events.provenance.get('source_id')
+    if ids is None or 'source_id' not in sessions.provenance:
+        return
+    ids = np.unique(ids)
+    if len(ids) == 1:
+        sessions.provenance['source_id'] = np.full(len(sessions.event_code), ids[0], dtype=np.int32)
+
 
 class StressedPipelineFacade:
     """
@@ -10,38 +34,180 @@ class StressedPipelineFacade:
     providing a clean API for the UI or other consumers.
     """
 
-    def __init__(self):
-        self.pipeline = ProjectStressedPipeline()
+    def __init__(self, parser: LogParserAgent = None, hash_buckets: int = None,
+                 cache_dir: str = None, cache_bytes: int = DEFAULT_CACHE_BYTES):
+        """
+        Args:
+            parser: Log parser (default LogParserAgent)
+            hash_buckets: Feature-hashing vocabulary size (None = learned vocabulary)
+            cache_dir: Directory of the stage cache. When set, process_etl,
+                       create_sessions and vectorize_sessions reuse stored results
+                       for inputs they have already processed. Stage outputs are
+                       then treated as immutable: do not modify them in place.
+            cache_bytes: Size cap of the stage cache (least recently used entries go first)
+        """
+        self.pipeline = ProjectStressedPipeline(parser=parser, hash_buckets=hash_buckets)
+        self.cache = StageCache(cache_dir, cache_bytes) if cache_dir else None
+        # id(stage output) -> (weak reference, digest): the next stage keys off
+        # the digest of the output it is given instead of rehashing its content
+        self._digests = {}
 
-    def generate_synthetic_logs(self, num_orders: int = 100) -> List[str]:
+    def generate_synthetic_logs(self, num_orders: int = 100, packed: bool = False) -> Union[List[str], LogBuffer]:
         """
-        Generates synthetic messy logs.
+        Generates synthetic messy logs. With packed=True they come back as one
+        compact LogBuffer, which the ETL references instead of copying lines from.
         """
-        return generate_messy_logs(num_orders=num_orders)
+        logs = generate_messy_logs(num_orders=num_orders)
+        return LogBuffer.from_lines(logs) if packed else logs
 
-    def process_etl(self, raw_logs: List[str]) -> pd.DataFrame:
+    def process_etl(self, raw_logs: Union[List[str], LogBuffer], strict: bool = False, workers: int = 1) -> pd.DataFrame:
         """
         Runs the ETL process to convert raw logs into a structured DataFrame.
+        Set strict=True to validate every row through the Pydantic schema,
+        and workers > 1 (or None for all cores) to parse in a process pool.
+        """
+        # Parsers with mutable state (a learning Drain miner, the tiered
+        # backend) have no fingerprint: their ETL always runs
+        fingerprint = getattr(self.pipeline.parser, 'cache_fingerprint', lambda: None)()
+        if self.cache is None or fingerprint is None:
+            return self.pipeline.run_etl(raw_logs, strict=strict, workers=workers)
+        if not isinstance(raw_logs, LogBuffer):
+            raw_logs = LogBuffer.from_lines(raw_logs)
+
+        # A stored frame references the source_id of the run that stored it
+        def unpack(events):
+            _, source_id = self.pipeline.attach_raw_logs(raw_logs)
+            events['source_id'] = np.full(len(events), source_id, dtype=np.int32)
+            return events
+
+        return self._cached('etl', [raw_logs], lambda: self.pipeline.run_etl(raw_logs, strict=strict, workers=workers),
+                            unpack=unpack, parser=fingerprint, strict=strict)
+
+    def _digest(self, value) -> Optional[str]:
+        entry = self._digests.get(id(value))
+        if entry is not None and entry[0]() is value:
+            return entry[1]
+        return content_digest(value)
+
+    def _remember(self, value, digest: str):
+        self._digests = {key: entry for key, entry in self._digests.items() if entry[0]() is not None}
+        self._digests[id(value)] = (weakref.ref(value), digest)
+
+    def _cached(self, stage: str, inputs: List, compute: Callable, unpack: Callable = None, pack: Callable = None, **params):
         """
-        return self.pipeline.run_etl(raw_logs)
+        Run one stage through the cache: load its output if this stage already
+        ran on the same inputs with the same parameters, else compute and store it.
+        pack/unpack convert between the stage's output and the stored entry
+        (e.g. to store pipeline state the stage produced alongside it).
+        """
+        digests = [self._digest(value) for value in inputs]
+        if None in digests:
+            return compute()
+        key = StageCache.key(stage, digests, **params)
+        hit, entry = self.cache.get(key)
+        if hit:
+            output = unpack(entry) if unpack else entry
+            if stage != 'etl':
+                _adopt_source(output, inputs[0])
+        else:
+            output = compute()
+            self.cache.put(key, pack(output) if pack else output)
+        # The output's digest is its key: it names exactly what produced it
+        self._remember(output, key)
+        return output
+
+    def stream_etl(self, source, chunk_size: int = 50_000) -> Iterator[pd.DataFrame]:
+        """
+        Runs the ETL over a log file path (or any iterator of lines) chunk by chunk,
+        yielding one structured DataFrame per chunk with bounded memory.
+        """
+        return self.pipeline.stream_etl(source, chunk_size=chunk_size)
+
+    def process_sharded(self, raw_logs: Union[List[str], LogBuffer], workers: int = None) -> SessionBatch:
+        """
+        Runs ETL, sessionization and vectorization in one sharded pass: every
+        worker process handles whole orders (routed by hash of the Order ID).
+        Returns sessions ready for training.
+        """
+        return self.pipeline.run_sharded(raw_logs, workers=workers)
+
+    def process_log_files(self, patterns, workers: int = None) -> pd.DataFrame:
+        """
+        Runs the ETL over a glob of plain/gzip (rotated) log files and returns
+        one time-ordered structured DataFrame.
+        """
+        return self.pipeline.run_log_files_etl(patterns, workers=workers)
 
-    def create_sessions(self, df_events: pd.DataFrame) -> pd.DataFrame:
+    def create_sessions(self, df_events: pd.DataFrame) -> SessionBatch:
         """
         Groups events into user sessions.
         """
-        return self.pipeline.sessionize_data(df_events)
+        if self.cache is None:
+            return self.pipeline.sessionize_data(df_events)
+        return self._cached('sessions', [df_events], lambda: self.pipeline.sessionize_data(df_events))
+
+    def create_sessions_external(self, blocks, memory_budget: int = None) -> Iterator[SessionBatch]:
+        """
+        Groups more events than fit in memory into sessions by spilling them to
+        disk partitions. Takes event blocks, e.g. from stream_etl; yields
+        SessionBatches one partition at a time.
+        """
+        if memory_budget is None:
+            return self.pipeline.sessionize_external(blocks)
+        return self.pipeline.sessionize_external(blocks, memory_budget=memory_budget)
+
+    def stream_sessions(self, source, chunk_size: int = 50_000, **options) -> Iterator[SessionBatch]:
+        """
+        Sessionizes a log file (or iterator of lines) online, yielding closed
+        sessions as they complete. Options go to StreamingSessionizer
+        (inactivity_timeout, allowed_lateness, max_open_sessions).
+        """
+        sessionizer = StreamingSessionizer(**options)
+        return self.pipeline.stream_sessions(source, chunk_size=chunk_size, sessionizer=sessionizer)
 
-    def vectorize_sessions(self, df_sessions: pd.DataFrame) -> pd.DataFrame:
+    def vectorize_sessions(self, df_sessions: SessionBatch, dataset_dir: Optional[str] = None) -> SessionBatch:
         """
         Converts session data into vectors for the model.
+        With dataset_dir, also writes them as an on-disk training dataset.
+        """
+        if self.cache is None:
+            return self.pipeline.prepare_vectors(df_sessions, dataset_dir=dataset_dir)
+        pipeline = self.pipeline
+
+        # The vocabulary the stage leaves behind is part of its output
+        def pack(sessions):
+            return sessions, pipeline.event_to_id, pipeline.id_to_event
+
+        def unpack(entry):
+            sessions, pipeline.event_to_id, pipeline.id_to_event = entry
+            if dataset_dir is not None:
+                pipeline.save_training_data(sessions, dataset_dir)
+            return sessions
+
+        return self._cached('vectors', [df_sessions], lambda: pipeline.prepare_vectors(df_sessions, dataset_dir=dataset_dir),
+                            pack=pack, unpack=unpack, vocabulary=pipeline.vocabulary_fingerprint,
+                            hash_buckets=pipeline.hash_buckets, frozen=pipeline.frozen_vocab)
+
+    def train_model(self, df_ready: Union[SessionBatch, str], **options):
+        """
+        Trains the LSTM model on the prepared data (or an on-disk dataset directory).
+        Options (batch_size, epochs, shuffle, loader_workers) select mini-batch training;
+        warm_start=True fine-tunes the current model instead of starting over.
+        """
+        self.pipeline.train_model(df_ready, **options)
+
+    def save_checkpoint(self, path: str):
+        """
+        Saves model, optimizer state and vocabulary to resume training later.
         """
-        return self.pipeline.prepare_vectors(df_sessions)
+        self.pipeline.save_checkpoint(path)
 
-    def train_model(self, df_ready: pd.DataFrame):
+    def load_checkpoint(self, path: str, frozen_vocab: bool = False):
         """
-        Trains the LSTM model on the prepared data.
+        Restores a checkpoint; follow with train_model(..., warm_start=True) to
+        fine-tune on new sessions only.
         """
-        self.pipeline.train_model(df_ready)
+        self.pipeline.load_checkpoint(path, frozen_vocab=frozen_vocab)
 
     def get_vocabulary(self) -> Dict[int, str]:
         """
@@ -49,45 +215,53 @@ class StressedPipelineFacade:
         """
         return self.pipeline.id_to_event
 
-    def get_failure_stats(self, df_ready: pd.DataFrame) -> pd.DataFrame:
+    def save_vocabulary(self, path: str) -> str:
+        """
+        Saves the vocabulary to a versioned JSON file; returns its fingerprint.
+        """
+        return self.pipeline.save_vocabulary(path)
+
+    def load_vocabulary(self, path: str, frozen: bool = True) -> str:
+        """
+        Loads a saved vocabulary (frozen by default: encode only, unseen
+        events become <UNK>); returns its fingerprint.
+        """
+        return self.pipeline.load_vocabulary(path, frozen=frozen)
+
+    def get_hash_collision_report(self) -> Dict[str, Any]:
+        """
+        Returns how often event names share a bucket (feature hashing mode only).
+        """
+        return self.pipeline.hash_collision_report()
+
+    def get_failure_stats(self, df_ready: SessionBatch) -> pd.DataFrame:
         """
         Analyzes failures and returns a DataFrame with statistics.
         """
-        failed_orders = df_ready[df_ready['label'] == 0].copy()
-        if failed_orders.empty:
-            return pd.DataFrame(columns=['Last Successful Step', 'Count', 'Percentage'])
-        
-        # Get the last event before failure (or "UnknownEvent" if empty)
-        failed_orders['last_step'] = failed_orders['event_name'].apply(
-            lambda x: x[-1] if (isinstance(x, list) and len(x) > 0) else "UnknownEvent"
-        )
-        breakdown = failed_orders['last_step'].value_counts().reset_index()
-        breakdown.columns = ['Last Successful Step', 'Count']
-        breakdown['Percentage'] = (breakdown['Count'] / len(failed_orders) * 100).round(1)
-        return breakdown
+        return self.pipeline.failure_breakdown(df_ready)
 
-    def get_order_details(self, df_ready: pd.DataFrame, order_id: int) -> Dict[str, Any]:
+    def get_order_details(self, df_ready: SessionBatch, order_id: int) -> Dict[str, Any]:
         """
         Retrieves details for a specific order.
         """
-        row = df_ready[df_ready['order_id'] == order_id].iloc[0]
+        row = df_ready.session(df_ready.index_of(order_id))
         return {
             'order_id': row['order_id'],
             'status': "SUCCESS" if row['label'] == 1 else "FAILURE",
             'events': row['event_name'],
-            'raw_logs': row['raw_log'],
+            'raw_logs': self.pipeline.resolve_raw_logs(row),
             'encoded': row['encoded']
         }
 
-    def get_random_failed_order(self, df_ready: pd.DataFrame) -> int:
+    def get_random_failed_order(self, df_ready: SessionBatch) -> int:
         """
         Returns the ID of a random failed order.
         """
-        failed = df_ready[df_ready['label'] == 0]
-        if not failed.empty:
-            return failed.sample(1).iloc[0]['order_id']
+        failed = df_ready.order_id[df_ready.label == 0]
+        if len(failed):
+            return int(np.random.choice(failed))
         # Fallback to any order if no failures
-        return df_ready.iloc[0]['order_id']
+        return int(df_ready.order_id[0])
 
     def get_ai_insight(self, breakdown: pd.DataFrame) -> Dict[str, str]:
         """
@@ -0,0 +1,177 @@
+"""
+Multi-file ingestion for Project Stressed.
+Parses many rotated / gzip-compressed log files in parallel and k-way merges
+them by timestamp into one time-ordered event stream, in bounded memory.
+"""
+
+import os
+import tempfile
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from parsers.log_parser import LogParserAgent
+from pipeline.parallel import concat_values, drop_noise, map_with_parser
+from pipeline.spill import SpillRun, read_spill_blocks
+from utils.log_sources import iter_byte_chunks
+
+# Lines parsed per step of a file. Each spilled (and merged) block comes from
+# one such chunk, so memory per file is bounded by it, not by the file size.
+MERGE_CHUNK_LINES = 65_536
+
+
+def spill_file_runs(parser: LogParserAgent, path: str, source_id: int, spill_dir: str,
+                    strict: bool = False, chunk_lines: int = MERGE_CHUNK_LINES
+                    ) -> Tuple[List[str], Dict[str, pd.Index]]:
+    """
+    ETL one (possibly gzip-compressed) file chunk by chunk into time-ordered
+    runs on disk. Rotated files are normally already in time order and give
+    one run; wherever a chunk starts earlier than the previous one ended, a
+    new run begins. Each chunk is (stably) sorted on its own.
+
+    Args:
+        parser: Parser to use
+        path: Path to a plain or .gz log file
+        source_id: Id stored in the 'source_id' provenance column
+        spill_dir: Directory for the run files
+        strict: Validate every row through the Pydantic schema
+        chunk_lines: Lines parsed at a time
+
+    Returns:
+        (paths of the run files, in file order; the categories of every
+        Categorical column seen in the file). Each run holds column blocks
+        sorted by 'timestamp', with (source_id, raw_offset, raw_length)
+        provenance into the decompressed file.
+    """
+    prefix = os.path.join(spill_dir, f'src{source_id:05d}')
+    paths, run, last_key = [], None, None
+    categories = {}
+    for offset, data in iter_byte_chunks(path, chunk_lines):
+        columns = drop_noise(parser.parse_buffer(data, strict=strict))
+        keys = columns['timestamp']
+        if not len(keys):
+            continue
+        columns['raw_offset'] += offset
+        columns['source_id'] = np.full(len(keys), source_id, dtype=np.int32)
+        if len(keys) > 1 and np.any(keys[1:] < keys[:-1]):
+            order = np.argsort(keys, kind='stable')
+            columns = {name: values[order] for name, values in columns.items()}
+            keys = columns['timestamp']
+        if run is None or keys[0] < last_key:
+            if run is not None:
+                run.close()
+            run = SpillRun(f'{prefix}-{len(paths):05d}.run')
+            paths.append(run.path)
+        run.write(columns)
+        last_key = keys[-1]
+        for name, values in columns.items():
+            if isinstance(values, pd.Categorical):
+                seen = categories.get(name)
+                categories[name] = values.categories if seen is None else seen.append(values.categories).unique()
+    if run is not None:
+        run.close()
+    return paths, categories
+
+
+def _with_categories(blocks: Iterable[Dict[str, np.ndarray]],
+                     categories: Dict[str, pd.Index]) -> Iterator[Dict[str, np.ndarray]]:
+    """
+    Re-encode each block's Categorical columns on a shared dictionary, so all
+    merged blocks have the same dtype (and slices combine without re-encoding).
+    """
+    for block in blocks:
+        yield {name: values.set_categories(categories[name]) if name in categories else values
+               for name, values in block.items()}
+
+
+def kway_merge_columns(streams: List[Iterable[Dict[str, np.ndarray]]]) -> Iterator[Dict[str, np.ndarray]]:
+    """
+    K-way merge of block streams that are each sorted by 'timestamp'.
+
+    Only the current block of every stream is held. Each round computes a
+    bound: the smallest "last key" among the streams that still have blocks
+    to come. Every buffered row < bound can be emitted now (anything not yet
+    read is >= bound); rows equal to the bound wait until all their ties are
+    buffered, and the stream that set the bound reads its next block. The
+    emitted slice is ordered with a stable sort, so ties keep stream order.
+
+    Args:
+        streams: Iterables of column dicts sorted by 'timestamp', in input (file) order
+
+    Returns:
+        Iterator of column dicts, globally ordered by 'timestamp'
+    """
+    streams = [iter(stream) for stream in streams]
+
+    def pull(i: int) -> Optional[Dict[str, np.ndarray]]:
+        for block in streams[i]:
+            if len(block['timestamp']):
+                return block
+        return None
+
+    buffers = [pull(i) for i in range(len(streams))]
+    # A stream is live while more blocks may follow its buffer
+    live = [buffer is not None for buffer in buffers]
+
+    while any(buffer is not None for buffer in buffers):
+        tails = [buffers[i]['timestamp'][-1] for i in range(len(buffers)) if live[i]]
+        bound = min(tails) if tails else None
+
+        pieces = []
+        for i, buffer in enumerate(buffers):
+            if buffer is None:
+                continue
+            keys = buffer['timestamp']
+            stop = len(keys) if bound is None else int(np.searchsorted(keys, bound, side='left'))
+            if stop:
+                pieces.append({name: values[:stop] for name, values in buffer.items()})
+                buffer = {name: values[stop:] for name, values in buffer.items()} if stop < len(keys) else None
+            if live[i] and buffer is not None and buffer['timestamp'][-1] == bound:
+                following = pull(i)
+                if following is None:
+                    live[i] = False
+                else:
+                    buffer = {name: concat_values([buffer[name], following[name]]) for name in buffer}
+            buffers[i] = buffer
+
+        if not pieces:
+            continue
+        merged = {name: concat_values([piece[name] for piece in pieces]) for name in pieces[0]}
+        if len(pieces) > 1:
+            order = np.argsort(merged['timestamp'], kind='stable')
+            merged = {name: values[order] for name, values in merged.items()}
+        yield merged
+
+
+def iter_merged_file_columns(parser: LogParserAgent, paths: List[str], source_ids: List[int],
+                             workers: Optional[int] = None, strict: bool = False,
+                             spill_dir: Optional[str] = None) -> Iterator[Dict[str, np.ndarray]]:
+    """
+    Decompress + parse each file (in parallel) into time-ordered runs on disk,
+    then yield one time-ordered stream of column blocks merged from the runs.
+    Memory is bounded by one chunk per worker while parsing, and one block
+    per run while merging - not by the size of the input. The runs (compact
+    columns, no log text) are removed when the iterator finishes or is closed.
+
+    Args:
+        parser: Parser to use
+        paths: Plain/.gz log files (see utils.log_sources.expand_log_paths)
+        source_ids: Provenance id for each path
+        workers: Processes for per-file parsing (None = one per CPU core)
+        strict: Validate every row through the Pydantic schema
+        spill_dir: Where to put the run files (default: the system temp directory)
+
+    Returns:
+        Iterator of column dicts, ordered by timestamp
+    """
+    print(f"Ingesting {len(paths)} log files...")
+    with tempfile.TemporaryDirectory(prefix='rca-merge-', dir=spill_dir) as workdir:
+        tasks = [(path, source_id, workdir, strict) for path, source_id in zip(paths, source_ids)]
+        results = map_with_parser(parser, spill_file_runs, tasks, workers)
+        categories = {}
+        for _, file_categories in results:
+            for name, values in file_categories.items():
+                categories[name] = values if name not in categories else categories[name].append(values).unique()
+        runs = [run for file_runs, _ in results for run in file_runs]
+        yield from kway_merge_columns([_with_categories(read_spill_blocks(run), categories) for run in runs])
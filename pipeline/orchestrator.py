@@ -3,7 +3,11 @@ Pipeline orchestrator for Project Stressed.
 Coordinates the ETL, sessionization, vectorization, training, and reporting.
 """
 
-from typing import List, Dict
+import os
+import time
+from itertools import repeat
+from typing import Dict, Iterable, Iterator, List, Optional, Union
+import numpy as np
 import pandas as pd
 import torch
 import torch.nn as nn
@@ -11,6 +15,27 @@ import torch.optim as optim
 
 from parsers.log_parser import LogParserAgent
 from models.lstm_model import RCA_LSTM
+from models.records import PROVENANCE_COLUMNS, SessionBatch
+from pipeline.parallel import drop_noise, etl_columns, parallel_etl_columns, resolve_workers
+from pipeline.merge import iter_merged_file_columns
+from pipeline.sessionizer import StreamingSessionizer
+from pipeline.spill import DEFAULT_MEMORY_BUDGET, ExternalSessionizer
+from pipeline.sharding import sharded_sessions
+from pipeline.training import (DEFAULT_BATCH_SIZE, MappedSessionDataset, SessionDataset, grow_optimizer_state,
+                               load_checkpoint, save_checkpoint, session_loader, train_minibatch,
+                               write_session_dataset)
+from pipeline.vocabulary import (RESERVED_IDS, collision_report, hashed_ids, load_vocabulary,
+                                 save_vocabulary, vocabulary_fingerprint)
+from utils.timestamps import to_epoch
+from utils.log_sources import (LogBuffer, LogFileRef, LogSource, expand_log_paths, iter_byte_chunks,
+                               iter_chunks, iter_log_lines)
+
+
+def _as_session_batch(sessions) -> SessionBatch:
+    """
+    Accept sessions built elsewhere as a DataFrame of per-order lists.
+    """
+    return sessions if isinstance(sessions, SessionBatch) else SessionBatch.from_frame(sessions)
 
 
 class ProjectStressedPipeline:
@@ -18,54 +43,214 @@ class ProjectStressedPipeline:
     Main pipeline orchestrator that coordinates all stages of the RCA process.
     """
     
-    def __init__(self):
-        # Initialize the Parser Agent
-        self.parser = LogParserAgent()
+    def __init__(self, parser: LogParserAgent = None, hash_buckets: int = None):
+        # Initialize the Parser Agent (pass a DrainLogParser to mine templates instead)
+        self.parser = parser if parser is not None else LogParserAgent()
         
         # Initialize the Vocabulary. 
         # <PAD> (ID 0) is used to fill short sequences so all are same length.
         # <UNK> (ID 1) is used for events we haven't seen before.
         self.event_to_id = {"<PAD>": 0, "<UNK>": 1}
         self.id_to_event = {0: "<PAD>", 1: "<UNK>"}
+        # Feature hashing mode: event names map to a FIXED number of buckets
+        # through a stable hash, so the vocabulary (and the model) never grows.
+        # event_to_id then only records which names were seen in which bucket.
+        if hash_buckets is not None and hash_buckets < 1:
+            raise ValueError("hash_buckets must be a positive integer (or None for a learned vocabulary).")
+        self.hash_buckets = hash_buckets
+        # Frozen vocabulary (e.g. loaded for scoring): prepare_vectors only
+        # encodes, and events it does not know become <UNK>
+        self.frozen_vocab = False
         
         self.model = None
+        self.optimizer = None
+        # Log sources referenced by the 'source_id' provenance column
+        # (LogBuffer, MappedLogFile or LogFileRef), for raw-line lookups
+        self.raw_sources = {}
+        # Never reset (even when raw_sources is cleared), so a reference into
+        # a dropped source raises KeyError instead of reading a newer one
+        self._next_source_id = 0
+        # Aggregate stats merged from the shards of the last run_sharded call
+        self.shard_stats = None
         # Maximum length of an order sequence to consider. 
         # Shorter orders get padded, longer ones get truncated.
         self.max_seq_len = 15
+        # Loss and throughput of the last train_model call
+        self.training_stats = None
+        # Sessions per length bucket in training: each bucket is padded only to
+        # its own longest session
+        self.bucket_size = 512
 
     # --------------------------------------------------------------------------
     # STEP 1: ETL (Extract, Transform, Load)
     # --------------------------------------------------------------------------
-    def run_etl(self, raw_logs: List[str]) -> pd.DataFrame:
+    def run_etl(self, raw_logs: Union[List[str], LogBuffer], strict: bool = False,
+                workers: int = 1) -> pd.DataFrame:
         """
-        Ingests raw strings, parses them into Objects, converts to DataFrame.
+        Ingests raw strings, parses them into columns, converts to DataFrame.
+        Replaces the log sources of any earlier run.
         
         Args:
-            raw_logs: List of raw log strings
+            raw_logs: List of raw log strings, or a LogBuffer / MappedLogFile.
+                      A list is packed into one LogBuffer first. Each event keeps
+                      (source_id, raw_offset, raw_length) into the buffer instead
+                      of a copy of its line.
+            strict: Validate every row through the Pydantic schema (slower)
+            workers: Parser processes to use (1 = serial, None = one per CPU core).
+                     Small inputs always run serially.
             
         Returns:
             DataFrame with structured events
         """
         print("Running ETL Process...")
-        data = []
-        for line in raw_logs:
-            # ASK THE PARSER to structure the data
-            parsed = self.parser.parse(line)
+        
+        # ASK THE PARSER to structure the whole batch at once.
+        # We get back one array per field instead of one object per line,
+        # already filtered: logs that didn't have an Order ID are noise.
+        # A reference to the RAW log is kept too, so we can trace back later (Debuggability).
+        raw_logs, source_id = self.attach_raw_logs(raw_logs)
+        columns = parallel_etl_columns(self.parser, raw_logs, workers=workers, strict=strict)
+        columns['source_id'] = np.full(len(columns['timestamp']), source_id, dtype=np.int32)
+        return self._events_frame(columns)
+
+    def attach_raw_logs(self, raw_logs: Union[List[str], LogBuffer]):
+        """
+        Make raw_logs the only log source (as run_etl does), so the 'source_id'
+        of events parsed from it resolves to their lines.
+        
+        Returns:
+            (the logs as a LogBuffer, their source_id)
+        """
+        if not isinstance(raw_logs, LogBuffer):
+            raw_logs = LogBuffer.from_lines(raw_logs)
+        self.raw_sources.clear()
+        return raw_logs, self._register_source(raw_logs)
+
+    def _register_source(self, source) -> int:
+        """
+        Remember a log source so raw lines can be resolved on demand later.
+        Returns its id for the 'source_id' provenance column.
+        """
+        source_id = self._next_source_id
+        self._next_source_id += 1
+        self.raw_sources[source_id] = source
+        return source_id
+
+    def stream_etl(self, source: LogSource, chunk_size: int = 50_000, strict: bool = False,
+                   as_frame: bool = True) -> Iterator[Union[pd.DataFrame, Dict[str, np.ndarray]]]:
+        """
+        Streaming ETL: reads a file path or any iterator of lines and yields one
+        result per chunk of input lines. Only one chunk is held at a time, so
+        peak memory depends on chunk_size, not on the size of the input.
+        Events from a file reference their line by byte offset (re-read from
+        disk on demand); a one-shot iterator cannot be re-read, so its events
+        keep a 'raw_log' copy.
+        
+        Args:
+            source: Path to a log file, or any iterable of raw log strings
+            chunk_size: Input lines per chunk
+            strict: Validate every row through the Pydantic schema (slower)
+            as_frame: Yield DataFrames (True) or raw column dicts (False)
             
-            # We filter out logs that didn't have an Order ID (noise)
-            if parsed.order_id:
-                # Convert Pydantic object to Python Dict
-                row = parsed.dict()
-                # Store the RAW log too, so we can trace back later (Debuggability)
-                row['raw_log'] = line 
-                data.append(row)
-                
-        return pd.DataFrame(data)
+        Returns:
+            Iterator over per-chunk DataFrames (same columns as run_etl) or column dicts
+        """
+        if isinstance(source, (str, os.PathLike)):
+            source_id = self._register_source(LogFileRef(source))
+            for offset, data in iter_byte_chunks(source, chunk_size):
+                columns = drop_noise(self.parser.parse_buffer(data, strict=strict))
+                columns['raw_offset'] += offset
+                columns['source_id'] = np.full(len(columns['timestamp']), source_id, dtype=np.int32)
+                yield self._events_frame(columns) if as_frame else columns
+            return
+        for chunk in iter_chunks(iter_log_lines(source), chunk_size):
+            columns = etl_columns(self.parser, chunk, strict=strict)
+            yield self._events_frame(columns) if as_frame else columns
+
+    def iter_log_files_etl(self, patterns, workers: int = None,
+                           strict: bool = False) -> Iterator[pd.DataFrame]:
+        """
+        Multi-file ETL: takes a glob (or list of globs) of plain or gzip-compressed,
+        possibly rotated log files, parses them in parallel, and yields
+        DataFrame blocks k-way merged into one time-ordered event stream.
+        Files are parsed chunk by chunk into time-ordered runs of compact
+        columns on disk, and the merge holds one block per run, so memory does
+        not grow with the input. Each file is registered as a source; its lines
+        are re-read from disk only when displayed.
+        
+        Args:
+            patterns: Glob pattern(s), e.g. 'logs/*/app.log*'
+            workers: Processes for per-file parsing (None = one per CPU core)
+            strict: Validate every row through the Pydantic schema (slower)
+            
+        Returns:
+            Iterator over time-ordered DataFrame blocks (same columns as run_etl)
+        """
+        paths = expand_log_paths(patterns)
+        if not paths:
+            raise FileNotFoundError(f"No log files match {patterns!r}")
+        source_ids = [self._register_source(LogFileRef(path)) for path in paths]
+        for columns in iter_merged_file_columns(self.parser, paths, source_ids, workers=workers, strict=strict):
+            yield self._events_frame(columns)
+
+    def run_log_files_etl(self, patterns, workers: int = None, strict: bool = False) -> pd.DataFrame:
+        """
+        Same as iter_log_files_etl, collected into one time-ordered DataFrame
+        (which holds every event; iterate iter_log_files_etl to stay bounded).
+        """
+        print("Running Multi-File ETL Process...")
+        self.raw_sources.clear()
+        blocks = list(self.iter_log_files_etl(patterns, workers=workers, strict=strict))
+        if not blocks:
+            return self._events_frame(etl_columns(self.parser, []))
+        return pd.concat(blocks, ignore_index=True)
+
+    @staticmethod
+    def _events_frame(columns: Dict[str, np.ndarray]) -> pd.DataFrame:
+        """
+        Build the structured events DataFrame from filtered ETL columns.
+        """
+        frame = {
+            'timestamp': columns['timestamp'],
+            'event_name': columns['event_name'],
+            'order_id': columns['order_id'],
+            'severity': columns['severity'],
+            'details': "Mock Details",
+        }
+        for name in PROVENANCE_COLUMNS:
+            if name in columns:
+                frame[name] = columns[name]
+        return pd.DataFrame(frame)
+
+    def resolve_raw_logs(self, row) -> List[str]:
+        """
+        Returns the original log lines of one session row. Only here is the
+        text decoded: each (source_id, offset, length) reference is read from
+        its registered source.
+        
+        Args:
+            row: One session (SessionBatch.session) or sessions DataFrame row
+            
+        Returns:
+            List of raw log strings
+        """
+        if 'raw_log' in row:
+            return list(row['raw_log'])
+        source_ids = row['source_id'] if 'source_id' in row else repeat(0)
+        refs = list(zip(source_ids, row['raw_offset'], row['raw_length']))
+        lines = [None] * len(refs)
+        # One read per source (a file on disk is opened once, not once per line)
+        for source_id in {ref[0] for ref in refs}:
+            positions = [i for i, ref in enumerate(refs) if ref[0] == source_id]
+            texts = self.raw_sources[source_id].read_lines([refs[i][1:] for i in positions])
+            for i, text in zip(positions, texts):
+                lines[i] = text
+        return lines
 
     # --------------------------------------------------------------------------
     # STEP 2: SESSIONIZATION
     # --------------------------------------------------------------------------
-    def sessionize_data(self, df: pd.DataFrame) -> pd.DataFrame:
+    def sessionize_data(self, df: pd.DataFrame) -> SessionBatch:
         """
         Groups the flat list of events into 'Sessions' based on Order ID.
         This turns a CSV-like structure into a Sequence structure.
@@ -74,116 +259,498 @@ class ProjectStressedPipeline:
             df: DataFrame with structured events
             
         Returns:
-            DataFrame with sessionized data
+            SessionBatch: flat event arrays grouped by order, plus per-order offsets
         """
         print("Sessionizing Data...")
         
-        # Ensure timestamp is a true Datetime object for sorting
-        df['timestamp'] = pd.to_datetime(df['timestamp'])
+        # Timestamps arrive as int64 epoch seconds, parsed once at ingest, so
+        # sorting compares plain integers. Only foreign frames (e.g. with
+        # timestamp strings) are converted here - with a fixed format, no inference.
+        if not pd.api.types.is_integer_dtype(df['timestamp']):
+            df['timestamp'] = to_epoch(df['timestamp'].to_numpy())
         
         # Sort is CRITICAL. The LSTM assumes events are in chronological order.
-        df = df.sort_values(by=['order_id', 'timestamp'])
-        
-        # Pandas Magic: Group by ID, and aggregate columns into lists.
-        # Result: One row per order, with a list of events like ['Login', 'Auth', ...]
-        sessions = df.groupby('order_id').agg({
-            'event_name': list,
-            'raw_log': list,
-            'timestamp': list
-        }).reset_index()
-        
+        # Input that is already time-ordered (e.g. from the multi-file k-way merge)
+        # skips the global sort: the stable grouping below keeps each order's
+        # rows in input order.
+        if not df['timestamp'].is_monotonic_increasing:
+            df = df.sort_values(by=['order_id', 'timestamp'], kind='stable')
+        
+        # Group rows by Order ID into one session per order, kept in CSR layout:
+        # every column is gathered ONCE into a flat array in grouped order, and
+        # order i owns the slice offsets[i]:offsets[i + 1]. No per-order lists are built.
+        # Events stay dictionary-encoded (small integer codes + ONE copy of each name),
+        # and provenance stays a compact (source_id, raw_offset, raw_length) reference.
+        #
         # LABELING LOGIC:
         # How do we know if an order failed? 
         # Rule: If "Screen_S14" (Success Screen) is in the event list, it's a 1.
-        sessions['label'] = sessions['event_name'].apply(lambda x: 1 if "Screen_S14" in x else 0)
+        # On codes this is one comparison per event and one OR per order.
+        provenance = {name: df[name].to_numpy() for name in PROVENANCE_COLUMNS if name in df.columns}
+        return SessionBatch.from_events(df['order_id'].to_numpy(), df['timestamp'].to_numpy(),
+                                        df['event_name'], provenance)
+
+    def sessionize_external(self, blocks: Iterable[Union[pd.DataFrame, Dict[str, np.ndarray]]],
+                            memory_budget: int = DEFAULT_MEMORY_BUDGET,
+                            spill_dir: str = None) -> Iterator[SessionBatch]:
+        """
+        Out-of-core sessionization for more events than fit in RAM (e.g. a week
+        of logs). Event blocks are hash-partitioned by Order ID into spill files,
+        then each partition is sorted and grouped on its own. The sessions are
+        the same as sessionize_data's, delivered one partition at a time.
         
-        return sessions
+        Args:
+            blocks: Event blocks, e.g. stream_etl(...) or iter_log_files_etl(...)
+            memory_budget: Bytes one partition may take when loaded for sorting
+            spill_dir: Directory for the temporary spill files (default: system temp)
+            
+        Returns:
+            Iterator over SessionBatches (ordered by order_id within each)
+        """
+        print("Sessionizing Data (external memory)...")
+        sessionizer = ExternalSessionizer(memory_budget=memory_budget, spill_dir=spill_dir)
+        return sessionizer.sessionize(blocks)
+
+    def stream_sessions(self, source: LogSource, chunk_size: int = 50_000,
+                        sessionizer: StreamingSessionizer = None) -> Iterator[SessionBatch]:
+        """
+        Online sessionization: streams the source through the ETL and yields the
+        sessions closed by each chunk (success event, ERROR line, or inactivity
+        past the event-time watermark), then the ones still open at the end.
+        
+        Args:
+            source: Path to a log file, or any iterable of raw log strings
+            chunk_size: Input lines per chunk
+            sessionizer: Configured StreamingSessionizer (default settings if None)
+            
+        Returns:
+            Iterator over SessionBatches of closed sessions
+        """
+        sessionizer = sessionizer if sessionizer is not None else StreamingSessionizer()
+        for columns in self.stream_etl(source, chunk_size=chunk_size, as_frame=False):
+            closed = sessionizer.update(columns)
+            if len(closed):
+                yield closed
+        remaining = sessionizer.flush()
+        if len(remaining):
+            yield remaining
 
     # --------------------------------------------------------------------------
     # STEP 3: VECTORIZATION
     # --------------------------------------------------------------------------
-    def prepare_vectors(self, sessions: pd.DataFrame) -> pd.DataFrame:
+    def prepare_vectors(self, sessions: SessionBatch, dataset_dir: Optional[str] = None) -> SessionBatch:
         """
-        Builds the dictionary (Vocabulary) and converts text lists to integer lists.
+        Builds the dictionary (Vocabulary) and converts every event code to its integer ID.
         
         Args:
-            sessions: DataFrame with sessionized data
+            sessions: SessionBatch (or a sessions DataFrame with 'event_name' lists)
+            dataset_dir: Also write the encoded sessions there as an on-disk
+                         training dataset (see save_training_data)
             
         Returns:
-            DataFrame with encoded sequences
+            A copy of the sessions with the flat 'encoded' ID array filled in
         """
         print("Building Vector Vocabulary...")
+        sessions = _as_session_batch(sessions)
+        dictionary = sessions.dictionary
+        
+        if self.hash_buckets:
+            # Hashing mode: no counting pass over the data - only the (small)
+            # dictionary is hashed, then every event is translated in one gather
+            code_to_id = hashed_ids(dictionary, self.hash_buckets)
+            if not self.frozen_vocab:
+                # Only record names that occur (the dictionary can still list
+                # categories whose rows were dropped as noise)
+                present = np.flatnonzero(np.bincount(sessions.event_code, minlength=len(dictionary)))
+                self._record_hashed(dictionary[present].tolist(), code_to_id[present].tolist())
+        elif self.frozen_vocab:
+            # Frozen: skip the vocabulary pass, encode with the loaded IDs
+            code_to_id = np.array([self.event_to_id.get(e, 1) for e in dictionary], dtype=np.int64)
+        else:
+            # 1. Count every event (the codes ARE the factorized event column):
+            #    one bincount over the flat array, no Python loop over events
+            counts = np.bincount(sessions.event_code, minlength=len(dictionary))
+            present = np.flatnonzero(counts)
+            
+            # 2. Assign a unique ID to each new event name
+            self._extend_vocabulary(dictionary[present].tolist(), counts[present].tolist())
+            
+            # 3. One lookup table translates dictionary code -> vocabulary ID
+            #    (Default to 1 (<UNK>) if not found)
+            code_to_id = np.array([self.event_to_id.get(e, 1) for e in dictionary], dtype=np.int64)
+        
+        # 4. Translate every event in one NumPy gather. The offsets still say
+        #    which slice belongs to which order. The input batch is not modified
+        #    (the result shares its arrays and adds 'encoded').
+        sessions = sessions.with_encoded(code_to_id[sessions.event_code])
+        if dataset_dir is not None:
+            self.save_training_data(sessions, dataset_dir)
+        return sessions
+
+    @property
+    def vocab_size(self) -> int:
+        """
+        Number of IDs the model's embedding must cover. Fixed in hashing mode.
+        """
+        if self.hash_buckets:
+            return RESERVED_IDS + self.hash_buckets
+        return len(self.event_to_id)
+
+    def _record_hashed(self, events: List[str], ids: List[int]):
+        """
+        Remember which event names landed in which bucket (for display and
+        the collision report). Shared buckets list all their names.
+        """
+        for event, idx in zip(events, ids):
+            if event in self.event_to_id:
+                continue
+            self.event_to_id[event] = idx
+            self.id_to_event[idx] = event if idx not in self.id_to_event else f"{self.id_to_event[idx]} | {event}"
+
+    def save_vocabulary(self, path: str) -> str:
+        """
+        Persist the vocabulary (event_to_id, and the hashing setup) to a JSON
+        file stamped with a format version and a content fingerprint.
         
-        # 1. Scan all data to find every unique event name
-        all_events = set(x for seq in sessions['event_name'] for x in seq)
+        Args:
+            path: Target file
+            
+        Returns:
+            The vocabulary fingerprint
+        """
+        return save_vocabulary(path, self.event_to_id, self.hash_buckets)
+
+    def load_vocabulary(self, path: str, frozen: bool = True) -> str:
+        """
+        Replace the vocabulary with a saved one, e.g. the one a model was trained
+        with. By default it is frozen: prepare_vectors only encodes and never
+        adds IDs, so a scoring job skips the vocabulary pass entirely.
+        
+        Args:
+            path: File written by save_vocabulary
+            frozen: Keep the vocabulary fixed (unseen events -> <UNK>)
+            
+        Returns:
+            The vocabulary fingerprint
+        """
+        event_to_id, hash_buckets, fingerprint = load_vocabulary(path)
+        self._set_vocabulary(event_to_id, hash_buckets)
+        self.frozen_vocab = frozen
+        return fingerprint
+
+    def _set_vocabulary(self, event_to_id: Dict[str, int], hash_buckets: Optional[int]):
+        """
+        Replace the vocabulary (and the hashing setup) with a saved one.
+        """
+        self.event_to_id = {"<PAD>": 0, "<UNK>": 1}
+        self.id_to_event = {0: "<PAD>", 1: "<UNK>"}
+        self.hash_buckets = hash_buckets
+        if hash_buckets:
+            self._record_hashed(list(event_to_id), list(event_to_id.values()))
+        else:
+            self.event_to_id.update(event_to_id)
+            self.id_to_event = {idx: event for event, idx in self.event_to_id.items()}
+
+    @property
+    def vocabulary_fingerprint(self) -> str:
+        """
+        Content hash of the current vocabulary (same value save_vocabulary stamps).
+        """
+        return vocabulary_fingerprint(self.event_to_id, self.hash_buckets)
+
+    def hash_collision_report(self) -> Dict:
+        """
+        How often distinct event names share a hash bucket (hashing mode only).
         
-        # 2. Assign a unique ID to each event name
-        for event in all_events:
-            if event not in self.event_to_id:
-                idx = len(self.event_to_id)
-                self.event_to_id[event] = idx
-                self.id_to_event[idx] = event
+        Returns:
+            See pipeline.vocabulary.collision_report
+        """
+        if not self.hash_buckets:
+            raise ValueError("hash_collision_report needs a pipeline created with hash_buckets.")
+        return collision_report(self.event_to_id, self.hash_buckets)
 
-        # 3. Helper function to translate a list of strings to a list of ints
-        def encode(seq):
-            return [self.event_to_id.get(e, 1) for e in seq] # Default to 1 (<UNK>) if not found
+    def _extend_vocabulary(self, events: List[str], counts: List[int]):
+        """
+        Give IDs to the events the vocabulary does not know yet, most frequent
+        first and then by name, so the same data always gets the same IDs.
+        Known events keep their IDs.
+        """
+        new_events = [(-count, event) for event, count in zip(events, counts) if event not in self.event_to_id]
+        for _, event in sorted(new_events):
+            idx = len(self.event_to_id)
+            self.event_to_id[event] = idx
+            self.id_to_event[idx] = event
+
+    # --------------------------------------------------------------------------
+    # SHARDED MODE: STEPS 1-3 PER ORDER SHARD
+    # --------------------------------------------------------------------------
+    def run_sharded(self, raw_logs: Union[List[str], LogBuffer], num_shards: int = None,
+                    workers: int = None, strict: bool = False) -> SessionBatch:
+        """
+        ETL + sessionization + vectorization, sharded by Order ID across processes.
+        Parsed events are routed by hash(order_id) % num_shards; each worker then
+        sessionizes and encodes whole orders of its shard on its own. Only the
+        shards' small vocabularies and aggregate stats are merged here.
+        Replaces the log sources of any earlier run.
         
-        # 4. Apply encoding to the dataframe
-        sessions['encoded'] = sessions['event_name'].apply(encode)
+        Args:
+            raw_logs: List of raw log strings, or a LogBuffer / MappedLogFile
+            num_shards: Number of order shards (default: one per worker)
+            workers: Processes to use (None = one per CPU core, 1 = in-process)
+            strict: Validate every row through the Pydantic schema (slower)
+            
+        Returns:
+            SessionBatch with 'encoded' filled in, shard after shard
+        """
+        print("Running Sharded ETL / Sessionization / Vectorization...")
+        if not isinstance(raw_logs, LogBuffer):
+            raw_logs = LogBuffer.from_lines(raw_logs)
+        self.raw_sources.clear()
+        source_id = self._register_source(raw_logs)
+        num_shards = num_shards or resolve_workers(workers)
+        shards = sharded_sessions(self.parser, raw_logs, num_shards, workers=workers, strict=strict,
+                                  hash_buckets=self.hash_buckets)
+        
+        # Merge the vocabularies: global event counts decide the new IDs (as in
+        # prepare_vectors), then each shard's local IDs are translated with a
+        # lookup table the size of its vocabulary
+        totals = {}
+        for _, vocabulary, shard_stats in shards:
+            for event, count in zip(vocabulary, shard_stats['event_counts']):
+                totals[event] = totals.get(event, 0) + count
+        if not self.frozen_vocab:
+            if self.hash_buckets:
+                # Hashing mode: shards already encoded with the global IDs, no remap
+                self._record_hashed(list(totals), hashed_ids(totals, self.hash_buckets).tolist())
+            else:
+                self._extend_vocabulary(list(totals), list(totals.values()))
+        
+        stats = {'events': 0, 'orders': 0, 'failed_orders': 0, 'last_step_counts': {}}
+        for sessions, vocabulary, shard_stats in shards:
+            if not self.hash_buckets:
+                # (a frozen vocabulary sends unknown events to <UNK>)
+                local_to_global = np.array([self.event_to_id.get(event, 1) for event in vocabulary], dtype=np.int64)
+                sessions.encoded = local_to_global[sessions.encoded]
+            
+            for name in ('events', 'orders', 'failed_orders'):
+                stats[name] += shard_stats[name]
+            for step, count in shard_stats['last_step_counts'].items():
+                stats['last_step_counts'][step] = stats['last_step_counts'].get(step, 0) + count
+        self.shard_stats = stats
+        
+        sessions = SessionBatch.concat([shard[0] for shard in shards])
+        sessions.provenance['source_id'] = np.full(len(sessions.event_code), source_id, dtype=np.int32)
         return sessions
 
+    def failure_breakdown(self, sessions: SessionBatch) -> pd.DataFrame:
+        """
+        Counts failed orders by their LAST SUCCESSFUL STEP, working on event codes.
+        
+        Args:
+            sessions: SessionBatch (or a sessions DataFrame with 'event_name' lists)
+            
+        Returns:
+            DataFrame with 'Last Successful Step', 'Count' and 'Percentage'
+        """
+        sessions = _as_session_batch(sessions)
+        failed = sessions.label == 0
+        num_failed = int(failed.sum())
+        if num_failed == 0:
+            return pd.DataFrame(columns=['Last Successful Step', 'Count', 'Percentage'])
+        
+        # Last code of every failed order (-1 for an empty sequence): one gather
+        # at offsets[1:] - 1, counted with bincount
+        last_codes = sessions.last_codes()[failed]
+        counts = np.bincount(last_codes + 1, minlength=len(sessions.dictionary) + 1)
+        names = np.array(["No Events"] + list(sessions.dictionary), dtype=object)
+        
+        breakdown = pd.DataFrame({'Last Successful Step': names, 'Count': counts})
+        breakdown = breakdown[breakdown['Count'] > 0]
+        breakdown = breakdown.sort_values('Count', ascending=False, kind='stable').reset_index(drop=True)
+        breakdown['Percentage'] = (breakdown['Count'] / num_failed * 100).round(1)
+        return breakdown
+
     # --------------------------------------------------------------------------
     # STEP 4: TRAINING
     # --------------------------------------------------------------------------
-    def train_model(self, sessions: pd.DataFrame):
+    def save_training_data(self, sessions: SessionBatch, path: str) -> Dict:
+        """
+        Write encoded sessions to an on-disk training dataset (flat token, offset,
+        label and length .npy files) that train_model can memory-map.
+        
+        Args:
+            sessions: SessionBatch with encoded sequences (see prepare_vectors)
+            path: Target directory
+            
+        Returns:
+            The dataset metadata
+        """
+        return write_session_dataset(_as_session_batch(sessions), path, self.vocab_size,
+                                     self.vocabulary_fingerprint)
+
+    def _open_training_data(self, path: str) -> MappedSessionDataset:
+        """
+        Map an on-disk dataset, checking its IDs come from this pipeline's vocabulary
+        (a pipeline without one adopts the dataset's embedding size).
+        """
+        dataset = MappedSessionDataset(path, self.max_seq_len)
+        fingerprint = dataset.meta['vocabulary_fingerprint']
+        has_vocabulary = self.hash_buckets or len(self.event_to_id) > RESERVED_IDS
+        if has_vocabulary and fingerprint and fingerprint != self.vocabulary_fingerprint:
+            raise ValueError(f"Dataset {path} was encoded with a different vocabulary "
+                             f"(load the matching one with load_vocabulary).")
+        return dataset
+
+    def train_model(self, sessions: Union[SessionBatch, str], batch_size: Optional[int] = None,
+                    epochs: int = 10, shuffle: bool = True, loader_workers: int = 0,
+                    warm_start: bool = False):
         """
         Prepares tensors and runs the training loop for the LSTM.
         
+        By default this is full-batch training: one step per epoch over all
+        sessions. With batch_size, sessions are streamed through a DataLoader
+        in length-bucketed mini-batches instead (one step per batch), so memory
+        is bounded by the batch rather than the dataset; throughput ends up in
+        self.training_stats.
+        
         Args:
-            sessions: DataFrame with encoded sequences
+            sessions: SessionBatch with encoded sequences (see prepare_vectors), or
+                      the directory of an on-disk dataset (see save_training_data),
+                      which is memory-mapped and always trained in mini-batches
+            batch_size: Sessions per mini-batch (None for full-batch training)
+            epochs: Passes over the data
+            shuffle: Reshuffle the mini-batches every epoch
+            loader_workers: DataLoader worker processes that build the batches
+                            (0 = in the training process)
+            warm_start: Continue from the current model and optimizer (e.g. from
+                        load_checkpoint) and fine-tune on these sessions only, instead
+                        of starting from fresh weights. Events added to the vocabulary
+                        since then get new embedding rows; the learned rows are kept.
         """
         print("Training Neural Network...")
-        
-        # Extract the integer lists
-        X_list = sessions['encoded'].tolist()
+        if isinstance(sessions, (str, os.PathLike)):
+            dataset = self._open_training_data(sessions)
+            vocab_size = max(self.vocab_size, dataset.meta['vocab_size'])
+            batch_size = batch_size or DEFAULT_BATCH_SIZE
+        else:
+            sessions = _as_session_batch(sessions)
+            dataset, vocab_size = None, self.vocab_size
+        
+        if batch_size is not None:
+            if dataset is None:
+                dataset = SessionDataset.from_batch(sessions, self.max_seq_len)
+            loader = session_loader(dataset, batch_size, shuffle=shuffle, loader_workers=loader_workers)
+            self._prepare_model(vocab_size, warm_start)
+            self.training_stats = train_minibatch(self.model, loader, epochs=epochs, optimizer=self.optimizer)
+            print(f"Final Training Loss: {self.training_stats['loss']:.4f} "
+                  f"({self.training_stats['samples_per_sec']:,.0f} samples/sec)")
+            return
         
         # PADDING: 
         # Deep Learning requires rectangular matrices. We can't have rows of different lengths.
-        # We append 0s to short sequences until they reach max_seq_len.
-        X_padded = [x[:self.max_seq_len] + [0]*(self.max_seq_len-len(x)) for x in X_list]
-        
-        # Convert Lists -> PyTorch Tensors (The format the GPU/CPU needs)
-        X_tensor = torch.tensor(X_padded, dtype=torch.long)
-        # Convert Labels -> Tensor. Unsqueeze(1) changes shape from [100] to [100, 1]
-        y_tensor = torch.tensor(sessions['label'].tolist(), dtype=torch.float).unsqueeze(1)
-        
-        # Instantiate the Model
-        # vocab_size = length of our dictionary
-        # embedding_dim = 16 (size of the vector representing a word)
-        # hidden_dim = 32 (size of the LSTM's memory brain)
-        self.model = RCA_LSTM(len(self.event_to_id), 16, 32, 1)
-        
-        # Loss Function: Binary Cross Entropy (Standard for Yes/No classification)
-        criterion = nn.BCELoss()
-        
-        # Optimizer: Adam (Adaptive Moment Estimation) - standard choice for generic training
-        optimizer = optim.Adam(self.model.parameters(), lr=0.01)
+        # Sessions are bucketed by length and each bucket is padded with 0s only up to its
+        # own longest session (long ones are still truncated at max_seq_len). The real
+        # lengths go to the model, which packs the batch and skips the padding.
+        lengths = np.minimum(sessions.lengths, self.max_seq_len)
+        labels = sessions.label.astype(np.float32)
+        buckets = []
+        for rows in sessions.length_buckets(self.bucket_size, self.max_seq_len):
+            width = max(int(lengths[rows].max()), 1)
+            # Convert Arrays -> PyTorch Tensors (The format the GPU/CPU needs)
+            X_tensor = torch.from_numpy(sessions.pad(sessions.encoded, width, sessions=rows))
+            # Convert Labels -> Tensor. Unsqueeze(1) changes shape from [100] to [100, 1]
+            y_tensor = torch.from_numpy(labels[rows]).unsqueeze(1)
+            buckets.append((X_tensor, torch.from_numpy(lengths[rows]), y_tensor))
+        
+        # Instantiate the Model (or pick up the previous one when warm-starting)
+        self._prepare_model(vocab_size, warm_start)
+        optimizer = self.optimizer
+        
+        # Loss Function: Binary Cross Entropy (Standard for Yes/No classification).
+        # Summed per bucket and divided by the session count, so the buckets together
+        # give exactly the mean loss over all sessions.
+        criterion = nn.BCELoss(reduction='sum')
+        total = max(len(sessions), 1)
         
         # Training Loop
         self.model.train() # Set mode to train (enables gradient tracking)
-        EPOCHS = 10
-        
-        for i in range(EPOCHS):
+        start = time.perf_counter()
+        for i in range(epochs):
             optimizer.zero_grad()           # Clear previous gradients
-            output = self.model(X_tensor)   # Forward pass (Make predictions)
-            loss = criterion(output, y_tensor) # Calculate error
-            loss.backward()                 # Backward pass (Calculate corrections)
+            loss = 0.0
+            for X_tensor, len_tensor, y_tensor in buckets:
+                output = self.model(X_tensor, len_tensor)           # Forward pass (Make predictions)
+                bucket_loss = criterion(output, y_tensor) / total   # Calculate error
+                bucket_loss.backward()      # Backward pass (gradients add up over the buckets)
+                loss += bucket_loss.item()
             optimizer.step()                # Update weights (Apply corrections)
             
             if i % 2 == 0:
-                print(f"Epoch {i}: Loss {loss.item():.4f}")
+                print(f"Epoch {i}: Loss {loss:.4f}")
                 
-        print(f"Final Training Loss: {loss.item():.4f}")
+        seconds = time.perf_counter() - start
+        self.training_stats = {'loss': loss, 'samples': epochs * len(sessions), 'seconds': seconds,
+                               'samples_per_sec': epochs * len(sessions) / max(seconds, 1e-9)}
+        print(f"Final Training Loss: {loss:.4f}")
+
+    def _prepare_model(self, vocab_size: int, warm_start: bool):
+        """
+        Set up self.model and self.optimizer for a training run: fresh ones, or
+        for a warm start the existing ones, with the embedding grown to vocab_size.
+        """
+        if warm_start and self.model is not None:
+            added = self.model.grow_embedding(vocab_size)
+            if self.optimizer is None:
+                self.optimizer = optim.Adam(self.model.parameters(), lr=0.01)
+            elif added:
+                grow_optimizer_state(self.optimizer, self.model.embedding.weight)
+            if added:
+                print(f"Warm start: embedding grown by {added} rows for new events.")
+            return
+        
+        # vocab_size = length of our dictionary (or PAD/UNK + the hash buckets)
+        # embedding_dim = 16 (size of the vector representing a word)
+        # hidden_dim = 32 (size of the LSTM's memory brain)
+        self.model = RCA_LSTM(vocab_size, 16, 32, 1)
+        # Optimizer: Adam (Adaptive Moment Estimation) - standard choice for generic training
+        self.optimizer = optim.Adam(self.model.parameters(), lr=0.01)
+
+    def save_checkpoint(self, path: str):
+        """
+        Save the trained model, its optimizer state and the vocabulary to one
+        file, so training can resume later (train_model(..., warm_start=True)).
+        
+        Args:
+            path: Target file
+        """
+        if self.model is None:
+            raise ValueError("No trained model to checkpoint; run train_model first.")
+        vocabulary = {'event_to_id': self.event_to_id, 'hash_buckets': self.hash_buckets,
+                      'fingerprint': self.vocabulary_fingerprint}
+        save_checkpoint(path, self.model, self.optimizer, vocabulary,
+                        max_seq_len=self.max_seq_len, training_stats=self.training_stats)
+
+    def load_checkpoint(self, path: str, frozen_vocab: bool = False):
+        """
+        Restore model, optimizer and vocabulary from save_checkpoint. The
+        vocabulary stays open to new events unless frozen_vocab (scoring only).
+        
+        Args:
+            path: Checkpoint file
+            frozen_vocab: Freeze the restored vocabulary (see load_vocabulary)
+        """
+        checkpoint = load_checkpoint(path)
+        vocabulary = checkpoint['vocabulary']
+        self._set_vocabulary(vocabulary['event_to_id'], vocabulary['hash_buckets'])
+        self.frozen_vocab = frozen_vocab
+        self.max_seq_len = checkpoint['max_seq_len']
+        self.training_stats = checkpoint['training_stats']
+        
+        self.model = RCA_LSTM(**checkpoint['model_config'])
+        self.model.load_state_dict(checkpoint['model'])
+        self.optimizer = optim.Adam(self.model.parameters(), lr=0.01)
+        if checkpoint['optimizer'] is not None:
+            self.optimizer.load_state_dict(checkpoint['optimizer'])
 
     # ==========================================================================
     # REPORTING SUITE (The Transparency Layer)
@@ -209,34 +776,35 @@ class ProjectStressedPipeline:
             
         print("-" * 45)
 
-    def inspect_specific_order(self, sessions: pd.DataFrame, order_id_to_inspect: int = None):
+    def inspect_specific_order(self, sessions: SessionBatch, order_id_to_inspect: int = None):
         """
         TRACE: Pick one order and show the complete lifecycle.
         Raw Log -> Parsed Event -> Integer ID.
         
         Args:
-            sessions: DataFrame with sessionized data
+            sessions: SessionBatch with encoded sequences
             order_id_to_inspect: Specific order ID to inspect (optional)
         """
+        sessions = _as_session_batch(sessions)
         print("\n" + "="*60)
         print(" SINGLE ORDER DEEP DIVE TRACE")
         print("="*60)
 
         # If user didn't provide an ID, pick a random FAILED order to study
         if order_id_to_inspect is None:
-            failed = sessions[sessions['label'] == 0]
-            if not failed.empty:
-                row = failed.sample(1).iloc[0]
+            failed = np.flatnonzero(sessions.label == 0)
+            if len(failed):
+                row = sessions.session(np.random.choice(failed))
             else:
-                row = sessions.iloc[0] # Fallback if everything succeeded
+                row = sessions.session(0) # Fallback if everything succeeded
         else:
-            row = sessions[sessions['order_id'] == order_id_to_inspect].iloc[0]
+            row = sessions.session(sessions.index_of(order_id_to_inspect))
 
         # Extract data for display
         oid = row['order_id']
         events = row['event_name']
         vectors = row['encoded']
-        raws = row['raw_log']
+        raws = self.resolve_raw_logs(row)
         status = "SUCCESS" if row['label'] == 1 else "FAILURE"
 
         print(f"Order ID: {oid} | Final Status: [{status}]")
@@ -259,36 +827,31 @@ class ProjectStressedPipeline:
         print(f"\nTensor Input to LSTM (Padded to {self.max_seq_len}):")
         print(padded_vec)
 
-    def analyze_failures_detailed(self, sessions: pd.DataFrame):
+    def analyze_failures_detailed(self, sessions: SessionBatch):
         """
         INSIGHTS: Aggregates failure data to find the 'Smoking Gun'.
         Groups failures by the LAST SUCCESSFUL STEP to identify bottlenecks.
         
         Args:
-            sessions: DataFrame with sessionized data
+            sessions: SessionBatch with sessionized data
         """
         print("\n" + "="*60)
         print(" ROOT CAUSE AGGREGATION REPORT")
         print("="*60)
         
-        # Filter for failed orders only
-        failed_orders = sessions[sessions['label'] == 0].copy()
+        # Count failed orders only
+        sessions = _as_session_batch(sessions)
+        num_failed = int((sessions.label == 0).sum())
         
-        if failed_orders.empty:
+        if num_failed == 0:
             print("No failures to analyze.")
             return
 
-        # Feature Extraction: Get the last event in the list for every failed order
-        failed_orders['last_step'] = failed_orders['event_name'].apply(lambda x: x[-1] if x else "No Events")
-        
-        # Aggregation: Count how many times each step was the 'last step'
-        breakdown = failed_orders['last_step'].value_counts().reset_index()
-        breakdown.columns = ['Last Successful Step', 'Count']
-        
-        # Calculate Percentage
-        breakdown['Percentage'] = (breakdown['Count'] / len(failed_orders) * 100).round(1)
+        # Feature Extraction + Aggregation: count how many times each step was
+        # the 'last step' of a failed order (on event codes), with percentages
+        breakdown = self.failure_breakdown(sessions)
         
-        print(f"Total Failed Orders: {len(failed_orders)}")
+        print(f"Total Failed Orders: {num_failed}")
         print("\nTop Drop-off Points (Where flows are dying):")
         print(breakdown.to_string(index=False))
         
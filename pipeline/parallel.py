@@ -0,0 +1,212 @@
+"""
+Parallel execution helpers for Project Stressed.
+Splits work into chunks, runs them in a process pool, and merges the results
+back in the original order.
+"""
+
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+from parsers.log_parser import LogParserAgent
+from utils.log_sources import LogBuffer, MappedLogFile
+
+# Below this many lines, starting processes costs more than it saves.
+PARALLEL_MIN_LINES = 20_000
+
+# Chunk sizing: enough chunks per worker to balance load, but each chunk big
+# enough that pickling overhead stays small compared to parsing time.
+CHUNKS_PER_WORKER = 4
+MIN_CHUNK_SIZE = 5_000
+MAX_CHUNK_SIZE = 100_000
+
+# Each worker process receives the parser ONCE (via the pool initializer)
+# instead of once per chunk.
+_WORKER_PARSER: Optional[LogParserAgent] = None
+_WORKER_SOURCES: Dict[str, MappedLogFile] = {}
+
+
+def resolve_workers(workers: Optional[int]) -> int:
+    """
+    Turn a user-facing worker count into a concrete one.
+    None or 0 means "one per CPU core".
+    """
+    if not workers:
+        return os.cpu_count() or 1
+    return max(1, int(workers))
+
+
+def plan_chunk_size(num_lines: int, workers: int) -> int:
+    """
+    Adapt the chunk size to the input: ~CHUNKS_PER_WORKER chunks per worker,
+    clamped to [MIN_CHUNK_SIZE, MAX_CHUNK_SIZE].
+
+    Args:
+        num_lines: Total number of input lines
+        workers: Number of worker processes
+
+    Returns:
+        Lines per chunk
+    """
+    target = math.ceil(num_lines / (workers * CHUNKS_PER_WORKER))
+    return max(MIN_CHUNK_SIZE, min(MAX_CHUNK_SIZE, target))
+
+
+def etl_columns(parser: LogParserAgent, lines: List[str], strict: bool = False) -> Dict[str, np.ndarray]:
+    """
+    The ETL kernel for one chunk: parse, drop lines without an Order ID (noise),
+    and keep the raw line next to its fields.
+
+    Args:
+        parser: Parser to use
+        lines: Raw log strings
+        strict: Validate every row through the Pydantic schema
+
+    Returns:
+        Dict of filtered column arrays, including 'raw_log'
+    """
+    columns = parser.parse_many(lines, strict=strict)
+    columns['raw_log'] = np.asarray(lines, dtype=object)
+    return drop_noise(columns)
+
+
+def mapped_etl_columns(parser: LogParserAgent, source: LogBuffer, start: int = 0,
+                       end: Optional[int] = None, strict: bool = False) -> Dict[str, np.ndarray]:
+    """
+    The ETL kernel for a byte range of a log buffer (in memory or memory-mapped).
+    Same as etl_columns, but provenance is kept as 'raw_offset'/'raw_length'
+    into the buffer instead of a copy of each line.
+
+    Args:
+        parser: Parser to use
+        source: LogBuffer or MappedLogFile
+        start: First byte of the range (start of a line)
+        end: End of the range (default: end of file)
+        strict: Validate every row through the Pydantic schema
+
+    Returns:
+        Dict of filtered column arrays, including 'raw_offset' and 'raw_length'
+    """
+    return drop_noise(parser.parse_buffer(source.buffer, start, end, strict=strict))
+
+
+def drop_noise(columns: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    """
+    Drop the rows without an Order ID (noise) from parsed columns.
+    """
+    keep = ~columns.pop('order_id_null') & (columns['order_id'] != 0)
+    return {name: values[keep] for name, values in columns.items()}
+
+
+def concat_columns(parts: List[Dict[str, np.ndarray]]) -> Dict[str, np.ndarray]:
+    """
+    Merge per-chunk column dicts, preserving chunk order.
+    """
+    if len(parts) == 1:
+        return parts[0]
+    return {name: concat_values([part[name] for part in parts]) for name in parts[0]}
+
+
+def concat_values(chunks: list):
+    """
+    Concatenate one column's chunks. Dictionary-encoded (Categorical) chunks
+    are merged into one shared dictionary and their codes remapped.
+    """
+    if isinstance(chunks[0], pd.Categorical):
+        return union_categoricals(chunks)
+    return np.concatenate(chunks)
+
+
+def _init_worker(parser: LogParserAgent):
+    global _WORKER_PARSER
+    _WORKER_PARSER = parser
+
+
+def _mapped_etl_chunk(args) -> Dict[str, np.ndarray]:
+    path, start, end, strict = args
+    # Each worker maps the file once by path; the pages themselves are
+    # shared with every other process through the OS page cache.
+    source = _WORKER_SOURCES.get(path)
+    if source is None:
+        source = _WORKER_SOURCES[path] = MappedLogFile(path)
+    return mapped_etl_columns(_WORKER_PARSER, source, start, end, strict)
+
+
+def _buffer_etl_chunk(args) -> Dict[str, np.ndarray]:
+    data, base, strict = args
+    columns = drop_noise(_WORKER_PARSER.parse_buffer(data, strict=strict))
+    # Offsets are relative to the slice; shift them back into the whole buffer
+    columns['raw_offset'] += base
+    return columns
+
+
+def _call_with_worker_parser(task):
+    func, args = task
+    return func(_WORKER_PARSER, *args)
+
+
+def map_with_parser(parser: LogParserAgent, func, tasks: List[tuple], workers: Optional[int] = None) -> list:
+    """
+    Run func(parser, *task) for every task, in a process pool when it pays off.
+    Results come back in task order. func must be a module-level function.
+
+    Args:
+        parser: Parser handed to every call (sent once per worker process)
+        func: Module-level function taking (parser, *task)
+        tasks: List of argument tuples
+        workers: Number of processes (None = one per CPU core)
+
+    Returns:
+        List of results, one per task, in order
+    """
+    workers = min(resolve_workers(workers), len(tasks))
+    if workers <= 1 or not parser.parallel_safe:
+        return [func(parser, *args) for args in tasks]
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(parser,)) as pool:
+        return list(pool.map(_call_with_worker_parser, [(func, args) for args in tasks]))
+
+
+def parallel_etl_columns(parser: LogParserAgent, source: LogBuffer, workers: Optional[int] = None,
+                         strict: bool = False) -> Dict[str, np.ndarray]:
+    """
+    Run mapped_etl_columns over line-aligned byte ranges in a process pool and
+    merge the chunks in input order. Falls back to a plain serial call for
+    small inputs, a single worker, or a parser that carries state which must
+    not be split across processes.
+
+    Args:
+        parser: Parser to use (a copy is sent to each worker)
+        source: LogBuffer or MappedLogFile
+        workers: Number of processes (None = one per CPU core)
+        strict: Validate every row through the Pydantic schema
+
+    Returns:
+        Dict of filtered column arrays, including 'raw_offset'/'raw_length'
+    """
+    workers = resolve_workers(workers)
+    if workers <= 1 or source.line_count < PARALLEL_MIN_LINES:
+        return mapped_etl_columns(parser, source, strict=strict)
+    if not parser.parallel_safe:
+        print(f"{type(parser).__name__} keeps shared state; running ETL serially.")
+        return mapped_etl_columns(parser, source, strict=strict)
+
+    # Ranges are cut by bytes; lines are similar in length, so each holds
+    # about chunk_size lines
+    chunk_size = plan_chunk_size(source.line_count, workers)
+    ranges = source.line_aligned_ranges(math.ceil(source.line_count / chunk_size))
+    if isinstance(source, MappedLogFile):
+        # Workers map the file themselves; only the path travels
+        task, chunks = _mapped_etl_chunk, [(source.path, start, end, strict) for start, end in ranges]
+    else:
+        # An in-memory buffer is sent as compact bytes slices
+        task, chunks = _buffer_etl_chunk, [(source.buffer[start:end], start, strict) for start, end in ranges]
+    with ProcessPoolExecutor(max_workers=min(workers, len(chunks)), initializer=_init_worker,
+                             initargs=(parser,)) as pool:
+        # map() yields results in submission order -> deterministic merge
+        parts = list(pool.map(task, chunks))
+    return concat_columns(parts)
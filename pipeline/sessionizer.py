@@ -0,0 +1,262 @@
+"""
+Online sessionization for Project Stressed.
+Builds sessions incrementally from a stream of parsed event blocks, and emits
+each session as soon as it is closed instead of regrouping everything in a batch.
+"""
+
+import heapq
+from typing import Dict, List, Optional, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from models.records import PROVENANCE_COLUMNS, SessionBatch
+from utils.timestamps import MISSING_TIMESTAMP
+
+
+class _OpenSession:
+    """
+    Events received so far for one order, as the array pieces of each block.
+    """
+    __slots__ = ('codes', 'timestamps', 'provenance', 'last_seen')
+
+    def __init__(self):
+        self.codes = []
+        self.timestamps = []
+        self.provenance = {}
+        self.last_seen = MISSING_TIMESTAMP
+
+    def append(self, codes: np.ndarray, timestamps: np.ndarray, provenance: Dict[str, np.ndarray]):
+        self.codes.append(codes)
+        self.timestamps.append(timestamps)
+        for name, values in provenance.items():
+            self.provenance.setdefault(name, []).append(values)
+        # Lines without a timestamp do not move the session's clock
+        self.last_seen = max(self.last_seen, int(timestamps.max()))
+
+
+class StreamingSessionizer:
+    """
+    Incremental sessionizer driven by event time.
+
+    Events are appended to per-order open sessions as blocks arrive. A session
+    is closed when:
+    - its success event arrives ('Screen_S14'),
+    - an ERROR line arrives for it,
+    - it has been inactive for inactivity_timeout seconds of event time. Event
+      time advances through the watermark: the latest timestamp seen minus
+      allowed_lateness, so slightly out-of-order events still find their session.
+    Closed sessions are returned by update() as a SessionBatch. Event codes are
+    stable across batches: they index one dictionary that only grows.
+
+    State is bounded: beyond max_open_sessions, the least recently active
+    sessions (oldest last event time) are evicted and emitted as they are
+    (unfinished, label 0).
+    """
+
+    def __init__(self, inactivity_timeout: int = 1800, allowed_lateness: int = 0,
+                 max_open_sessions: Optional[int] = 100_000, success_event: str = "Screen_S14",
+                 error_severity: str = "ERROR"):
+        if inactivity_timeout <= 0:
+            raise ValueError("inactivity_timeout must be a positive number of seconds.")
+        if max_open_sessions is not None and max_open_sessions <= 0:
+            raise ValueError("max_open_sessions must be a positive integer (or None for no limit).")
+        self.inactivity_timeout = inactivity_timeout
+        self.allowed_lateness = allowed_lateness
+        self.max_open_sessions = max_open_sessions
+        self.success_event = success_event
+        self.error_severity = error_severity
+
+        # order_id -> _OpenSession
+        self._open: Dict[int, _OpenSession] = {}
+        # Min-heap of (last_seen, order_id), in event time. An entry is stale
+        # once its session has moved on (closed, or a later event arrived);
+        # stale entries are skipped when they reach the top.
+        self._by_last_seen: List[Tuple[int, int]] = []
+        self._dictionary: List[str] = []
+        self._codes: Dict[str, int] = {}
+        self._max_seen = MISSING_TIMESTAMP
+        self.evicted = 0
+
+    @property
+    def watermark(self) -> int:
+        """
+        Event time (epoch seconds) up to which the stream is considered complete.
+        """
+        if self._max_seen == MISSING_TIMESTAMP:
+            return MISSING_TIMESTAMP
+        return self._max_seen - self.allowed_lateness
+
+    @property
+    def open_sessions(self) -> int:
+        """
+        Number of sessions currently held in memory.
+        """
+        return len(self._open)
+
+    def update(self, events: Union[pd.DataFrame, Dict[str, np.ndarray]]) -> SessionBatch:
+        """
+        Add one block of parsed events (a run_etl / stream_etl frame or column
+        dict, in arrival order) and return the sessions this block closed.
+
+        Args:
+            events: Event block with 'timestamp', 'event_name', 'order_id', 'severity'
+                    and optionally provenance columns
+
+        Returns:
+            SessionBatch of the sessions closed by this block (may be empty)
+        """
+        closed = []
+        order_ids = np.asarray(events['order_id'])
+        if len(order_ids):
+            timestamps = np.asarray(events['timestamp'], dtype=np.int64)
+            codes = self._encode(events['event_name'])
+            terminal = ((codes == self._codes.get(self.success_event, -1))
+                        | np.asarray(events['severity'] == self.error_severity, dtype=bool))
+            provenance = {name: np.asarray(events[name]) for name in PROVENANCE_COLUMNS if name in events}
+
+            # Group the block by order (stable: each order's events keep arrival order)
+            perm = np.argsort(order_ids, kind='stable')
+            sorted_ids = order_ids[perm]
+            bounds = np.flatnonzero(np.r_[True, sorted_ids[1:] != sorted_ids[:-1], True])
+            for start, stop in zip(bounds[:-1], bounds[1:]):
+                order_id = int(sorted_ids[start])
+                rows = perm[start:stop]
+                # A terminal event closes the session; later events of the same
+                # order (in this block) open a new one
+                cuts = np.flatnonzero(terminal[rows]) + 1
+                for piece in np.split(rows, cuts):
+                    if not len(piece):
+                        continue
+                    session = self._open.pop(order_id, None) or _OpenSession()
+                    session.append(codes[piece], timestamps[piece],
+                                   {name: values[piece] for name, values in provenance.items()})
+                    if terminal[piece[-1]]:
+                        closed.append((order_id, session))
+                    else:
+                        self._open[order_id] = session
+                        heapq.heappush(self._by_last_seen, (session.last_seen, order_id))
+
+            valid = timestamps[timestamps != MISSING_TIMESTAMP]
+            if len(valid):
+                self._max_seen = max(self._max_seen, int(valid.max()))
+
+        closed.extend(self._expire())
+        closed.extend(self._evict())
+        return self._batch(closed)
+
+    def flush(self) -> SessionBatch:
+        """
+        Close and return every open session (end of stream).
+        """
+        closed = list(self._open.items())
+        self._open.clear()
+        self._by_last_seen.clear()
+        return self._batch(closed)
+
+    def _oldest(self) -> Optional[int]:
+        """
+        Event time of the least recently active open session (None if there is
+        none). Stale heap entries on top are dropped on the way.
+        """
+        heap = self._by_last_seen
+        while heap:
+            last_seen, order_id = heap[0]
+            session = self._open.get(order_id)
+            if session is not None and session.last_seen == last_seen:
+                return last_seen
+            heapq.heappop(heap)
+        return None
+
+    def _pop_oldest(self) -> tuple:
+        _, order_id = heapq.heappop(self._by_last_seen)
+        return order_id, self._open.pop(order_id)
+
+    def _expire(self) -> List[tuple]:
+        """
+        Close the sessions whose last event is older than the watermark allows.
+        The heap yields sessions by last event time, so the scan stops at the
+        first one that is still live.
+        """
+        expired = []
+        deadline = self.watermark - self.inactivity_timeout
+        while True:
+            oldest = self._oldest()
+            if oldest is None or oldest > deadline:
+                break
+            expired.append(self._pop_oldest())
+        self._compact()
+        return expired
+
+    def _evict(self) -> List[tuple]:
+        """
+        Emit the least recently active sessions while over max_open_sessions.
+        """
+        evicted = []
+        if self.max_open_sessions is None:
+            return evicted
+        while len(self._open) > self.max_open_sessions:
+            self._oldest()
+            evicted.append(self._pop_oldest())
+        self.evicted += len(evicted)
+        return evicted
+
+    def _compact(self):
+        """
+        Rebuild the heap from the open sessions once stale entries dominate it,
+        so its size stays proportional to the open sessions.
+        """
+        if len(self._by_last_seen) > 2 * len(self._open) + 1024:
+            self._by_last_seen = [(session.last_seen, order_id) for order_id, session in self._open.items()]
+            heapq.heapify(self._by_last_seen)
+
+    def _code(self, name: str) -> int:
+        code = self._codes.get(name)
+        if code is None:
+            code = self._codes[name] = len(self._dictionary)
+            self._dictionary.append(name)
+        return code
+
+    def _encode(self, event_names) -> np.ndarray:
+        """
+        Translate a block's event names to codes of the shared, growing dictionary.
+        Only the block's distinct names are looked up.
+        """
+        events = event_names.values if isinstance(event_names, pd.Series) else event_names
+        if not isinstance(events, pd.Categorical):
+            events = pd.Categorical(events)
+        table = np.array([self._code(name) for name in events.categories], dtype=np.int32)
+        return table[events.codes]
+
+    def _batch(self, closed: List[tuple]) -> SessionBatch:
+        """
+        Pack closed sessions into one CSR SessionBatch.
+        """
+        lengths = [sum(len(piece) for piece in session.codes) for _, session in closed]
+        offsets = np.concatenate(([0], np.cumsum(lengths, dtype=np.int64)))
+
+        def flat(pieces: List[np.ndarray], dtype) -> np.ndarray:
+            return np.concatenate(pieces) if pieces else np.array([], dtype=dtype)
+
+        codes = flat([piece for _, s in closed for piece in s.codes], np.int32)
+        timestamps = flat([piece for _, s in closed for piece in s.timestamps], np.int64)
+        # Only provenance that every closed session has lines up with the flat arrays
+        names = set.intersection(*(set(s.provenance) for _, s in closed)) if closed else set()
+        provenance = {name: flat([piece for _, s in closed for piece in s.provenance[name]], object)
+                      for name in PROVENANCE_COLUMNS if name in names}
+
+        # Late events were appended in arrival order: put each session in time
+        # order (ties keep arrival order), as sessionize_data does
+        session_of = np.repeat(np.arange(len(closed)), lengths)
+        perm = np.lexsort((timestamps, session_of))
+        if np.any(perm != np.arange(len(perm))):
+            codes, timestamps = codes[perm], timestamps[perm]
+            provenance = {name: values[perm] for name, values in provenance.items()}
+
+        # A session is a success if its success event appears anywhere in it
+        success = self._codes.get(self.success_event, -1)
+        is_success = codes == success
+        labels = (np.logical_or.reduceat(is_success, offsets[:-1]) if len(codes)
+                  else np.zeros(len(closed), dtype=bool))
+        order_ids = np.array([order_id for order_id, _ in closed], dtype=np.int64)
+        return SessionBatch(order_ids, offsets, codes, timestamps, list(self._dictionary), labels, provenance)
@@ -0,0 +1,146 @@
+"""
+Sharded execution for Project Stressed.
+Orders are independent, so the front half of the pipeline (parse, sessionize,
+encode) can run per shard: events are routed by hash(order_id) right after
+parsing, and each worker process handles whole orders. Only the small
+vocabularies and aggregate stats are merged at the end.
+"""
+
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from models.records import PROVENANCE_COLUMNS, SessionBatch
+from parsers.log_parser import LogParserAgent
+from pipeline.parallel import CHUNKS_PER_WORKER, concat_columns, drop_noise, map_with_parser, mapped_etl_columns
+from pipeline.spill import partition_of
+from pipeline.vocabulary import hashed_ids
+from utils.log_sources import LogBuffer, MappedLogFile
+
+
+def split_by_shard(columns: Dict[str, np.ndarray], num_shards: int) -> List[Dict[str, np.ndarray]]:
+    """
+    Route parsed rows to shards by hash(order_id). Rows keep their input
+    order inside each shard.
+
+    Args:
+        columns: Filtered ETL columns
+        num_shards: Number of shards
+
+    Returns:
+        One column dict per shard
+    """
+    shards = partition_of(columns['order_id'], num_shards)
+    order = np.argsort(shards, kind='stable')
+    bounds = np.searchsorted(shards[order], np.arange(num_shards + 1))
+    return [{name: values[order[bounds[i]:bounds[i + 1]]] for name, values in columns.items()}
+            for i in range(num_shards)]
+
+
+def parse_shard_chunk(parser: LogParserAgent, source, start: int, end: int, num_shards: int,
+                      strict: bool = False) -> List[Dict[str, np.ndarray]]:
+    """
+    Map step: parse one line-aligned byte range and split it by shard.
+
+    Args:
+        parser: Parser to use
+        source: Path of a memory-mapped file, or the range's bytes
+                (then 'start' is where those bytes begin in the whole buffer)
+        start: First byte of the range
+        end: End of the range
+        num_shards: Number of shards
+        strict: Validate every row through the Pydantic schema
+
+    Returns:
+        One column dict per shard, with provenance offsets into the whole buffer
+    """
+    if isinstance(source, str):
+        with MappedLogFile(source) as mapped:
+            columns = mapped_etl_columns(parser, mapped, start, end, strict)
+    else:
+        columns = drop_noise(parser.parse_buffer(source, strict=strict))
+        columns['raw_offset'] += start
+    return split_by_shard(columns, num_shards)
+
+
+def sessionize_shard(columns: Dict[str, np.ndarray],
+                     hash_buckets: Optional[int] = None) -> Tuple[SessionBatch, List[str], Dict]:
+    """
+    Reduce step: sessionize and encode the events of one shard.
+
+    Args:
+        columns: The shard's events, in input order
+        hash_buckets: Encode by feature hashing into this many buckets
+                      (final IDs, no coordination needed) instead of locally
+
+    Returns:
+        (sessions with 'encoded' holding LOCAL vocabulary positions (or hashed IDs),
+         the local vocabulary (event names in ID order), aggregate stats
+         including 'event_counts' aligned with the vocabulary)
+    """
+    # Time order within each order, ties in input order (as sessionize_data)
+    timestamps = columns['timestamp']
+    if len(timestamps) > 1 and np.any(timestamps[1:] < timestamps[:-1]):
+        order = np.argsort(timestamps, kind='stable')
+        columns = {name: values[order] for name, values in columns.items()}
+    provenance = {name: columns[name] for name in PROVENANCE_COLUMNS if name in columns}
+    sessions = SessionBatch.from_events(columns['order_id'], columns['timestamp'], columns['event_name'], provenance)
+
+    # Local vocabulary: the events this shard actually contains
+    counts = np.bincount(sessions.event_code, minlength=len(sessions.dictionary))
+    codes = np.flatnonzero(counts)
+    if hash_buckets:
+        sessions.encoded = hashed_ids(sessions.dictionary, hash_buckets)[sessions.event_code]
+    else:
+        local_ids = np.zeros(len(sessions.dictionary), dtype=np.int64)
+        local_ids[codes] = np.arange(len(codes))
+        sessions.encoded = local_ids[sessions.event_code]
+
+    failed = sessions.label == 0
+    last_counts = np.bincount(sessions.last_codes()[failed] + 1, minlength=len(sessions.dictionary) + 1)
+    names = ["No Events"] + list(sessions.dictionary)
+    stats = {
+        'events': len(sessions.event_code),
+        'orders': len(sessions),
+        'failed_orders': int(failed.sum()),
+        'last_step_counts': {names[i]: int(last_counts[i]) for i in np.flatnonzero(last_counts)},
+        'event_counts': counts[codes].tolist(),
+    }
+    return sessions, sessions.dictionary[codes].tolist(), stats
+
+
+def _sessionize_shard_task(parser: LogParserAgent, columns: Dict[str, np.ndarray],
+                           hash_buckets: Optional[int]) -> Tuple[SessionBatch, List[str], Dict]:
+    # map_with_parser passes the parser first; the reduce step does not need it
+    return sessionize_shard(columns, hash_buckets)
+
+
+def sharded_sessions(parser: LogParserAgent, source: LogBuffer, num_shards: int,
+                     workers: Optional[int] = None, strict: bool = False,
+                     hash_buckets: Optional[int] = None) -> List[Tuple[SessionBatch, List[str], Dict]]:
+    """
+    Parse, route, sessionize and encode a log buffer shard by shard.
+
+    Args:
+        parser: Parser to use (a copy is sent to each worker)
+        source: LogBuffer or MappedLogFile
+        num_shards: Number of order shards
+        workers: Processes (None = one per CPU core)
+        strict: Validate every row through the Pydantic schema
+        hash_buckets: Feature-hashing bucket count (None = learned vocabulary)
+
+    Returns:
+        sessionize_shard's result for every shard, in shard order
+    """
+    # An empty source still yields one (empty) chunk, so every shard exists
+    ranges = source.line_aligned_ranges(num_shards * CHUNKS_PER_WORKER) or [(0, 0)]
+    if isinstance(source, MappedLogFile):
+        # Workers map the file themselves; only the path travels
+        tasks = [(source.path, start, end, num_shards, strict) for start, end in ranges]
+    else:
+        tasks = [(source.buffer[start:end], start, end, num_shards, strict) for start, end in ranges]
+    chunks = map_with_parser(parser, parse_shard_chunk, tasks, workers)
+
+    # Each shard's pieces are joined in chunk (= input) order
+    shards = [concat_columns([chunk[i] for chunk in chunks]) for i in range(num_shards)]
+    return map_with_parser(parser, _sessionize_shard_task, [(columns, hash_buckets) for columns in shards], workers)
@@ -0,0 +1,222 @@
+"""
+External-memory sessionization for Project Stressed.
+Sessionizes more events than fit in RAM: events are hash-partitioned by order
+into spill files on disk, and each partition is then sorted and grouped on
+its own, within a memory budget.
+"""
+
+import os
+import pickle
+import tempfile
+from typing import Dict, Iterable, Iterator, List, Optional, Union
+
+import numpy as np
+import pandas as pd
+
+from models.records import PROVENANCE_COLUMNS, SessionBatch
+from utils.timestamps import to_epoch
+
+# Partitions per pass. Every order lands in exactly one partition, so each
+# partition holds complete sessions.
+SPILL_PARTITIONS = 64
+# A partition larger than the budget is split again (with another hash) up
+# to this many times; one huge order cannot be split and is loaded as is.
+MAX_SPILL_DEPTH = 3
+DEFAULT_MEMORY_BUDGET = 256 * 1024 * 1024
+
+_HASH_MULTIPLIERS = (0x9E3779B97F4A7C15, 0xC2B2AE3D27D4EB4F, 0x165667B19E3779F9, 0xD6E8FEB86659FD93)
+
+
+def partition_of(order_ids: np.ndarray, num_partitions: int, depth: int = 0) -> np.ndarray:
+    """
+    Hash order IDs to partition numbers. Each depth uses a different
+    multiplier, so re-splitting a partition spreads its orders again.
+
+    Args:
+        order_ids: int64 order IDs
+        num_partitions: Number of partitions
+        depth: Re-partitioning level (0 for the first pass)
+
+    Returns:
+        Partition number of every order ID
+    """
+    multiplier = np.uint64(_HASH_MULTIPLIERS[depth % len(_HASH_MULTIPLIERS)])
+    # Multiplicative hashing: wraps modulo 2**64, the high bits are well mixed
+    mixed = (order_ids.astype(np.uint64) * multiplier) >> np.uint64(32)
+    return (mixed % np.uint64(num_partitions)).astype(np.int64)
+
+
+class SpillRun:
+    """
+    One on-disk run (e.g. a partition): a stream of pickled column blocks.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, 'wb')
+        self.rows = 0
+
+    def write(self, columns: Dict[str, np.ndarray]):
+        pickle.dump(columns, self._file, protocol=pickle.HIGHEST_PROTOCOL)
+        self.rows += len(columns['order_id'])
+
+    def close(self):
+        self._file.close()
+
+    @property
+    def size(self) -> int:
+        return os.path.getsize(self.path)
+
+    def read(self) -> Iterator[Dict[str, np.ndarray]]:
+        return read_spill_blocks(self.path)
+
+
+def read_spill_blocks(path: str) -> Iterator[Dict[str, np.ndarray]]:
+    """
+    Stream the column blocks of a run file back, one at a time.
+    """
+    with open(path, 'rb') as f:
+        while True:
+            try:
+                yield pickle.load(f)
+            except EOFError:
+                return
+
+
+class ExternalSessionizer:
+    """
+    Sessionization for inputs larger than memory, in two passes:
+    1. Spill: each incoming event block is split by hash(order_id) and
+       appended to one run file per partition. Event names are encoded into
+       one shared dictionary on the way, so only integer codes hit the disk.
+    2. Sort: partitions are loaded one at a time, sorted by
+       (order_id, timestamp, arrival) and grouped into a SessionBatch.
+       A partition bigger than memory_budget is first split again.
+
+    The sessions are the same as sessionize_data's; they come out partition
+    by partition, ordered by order_id within each batch.
+    """
+
+    def __init__(self, memory_budget: int = DEFAULT_MEMORY_BUDGET, num_partitions: int = SPILL_PARTITIONS,
+                 spill_dir: Optional[str] = None, success_event: str = "Screen_S14"):
+        if num_partitions < 2:
+            raise ValueError("num_partitions must be at least 2.")
+        self.memory_budget = memory_budget
+        self.num_partitions = num_partitions
+        self.spill_dir = spill_dir
+        self.success_event = success_event
+        self._dictionary: List[str] = []
+        self._codes: Dict[str, int] = {}
+
+    def sessionize(self, blocks: Iterable[Union[pd.DataFrame, Dict[str, np.ndarray]]]) -> Iterator[SessionBatch]:
+        """
+        Spill all event blocks to disk, then yield one SessionBatch per partition.
+        Spill files are removed when the iterator is exhausted or closed.
+
+        Args:
+            blocks: Event blocks in arrival order (run_etl / stream_etl /
+                    iter_log_files_etl frames, or column dicts)
+
+        Returns:
+            Iterator over SessionBatches
+        """
+        with tempfile.TemporaryDirectory(prefix='rca-spill-', dir=self.spill_dir) as workdir:
+            runs = self._open_runs(workdir, 'p')
+            arrival = 0
+            for block in blocks:
+                columns = self._spill_columns(block, arrival)
+                arrival += len(columns['order_id'])
+                self._scatter(columns, runs, depth=0)
+            for run in runs:
+                run.close()
+            for run in runs:
+                yield from self._sessionize_run(run, workdir, depth=0)
+
+    def _open_runs(self, workdir: str, prefix: str) -> List[SpillRun]:
+        return [SpillRun(os.path.join(workdir, f'{prefix}-{i:03d}.spill')) for i in range(self.num_partitions)]
+
+    def _spill_columns(self, block, arrival: int) -> Dict[str, np.ndarray]:
+        """
+        Reduce one event block to the compact columns that are spilled.
+        """
+        timestamps = np.asarray(block['timestamp'])
+        if timestamps.dtype.kind not in 'iu':
+            timestamps = to_epoch(timestamps)
+        columns = {
+            'order_id': np.asarray(block['order_id'], dtype=np.int64),
+            'timestamp': timestamps.astype(np.int64, copy=False),
+            'event_code': self._encode(block['event_name']),
+        }
+        # The arrival position breaks timestamp ties exactly like a stable sort
+        columns['arrival'] = np.arange(arrival, arrival + len(columns['order_id']), dtype=np.int64)
+        for name in PROVENANCE_COLUMNS:
+            if name in block:
+                columns[name] = np.asarray(block[name])
+        return columns
+
+    def _encode(self, event_names) -> np.ndarray:
+        events = event_names.values if isinstance(event_names, pd.Series) else event_names
+        if not isinstance(events, pd.Categorical):
+            events = pd.Categorical(events)
+        table = np.empty(len(events.categories), dtype=np.int32)
+        for i, name in enumerate(events.categories):
+            code = self._codes.get(name)
+            if code is None:
+                code = self._codes[name] = len(self._dictionary)
+                self._dictionary.append(name)
+            table[i] = code
+        return table[events.codes]
+
+    def _scatter(self, columns: Dict[str, np.ndarray], runs: List[SpillRun], depth: int):
+        """
+        Append each row of a block to the run of its partition.
+        """
+        if not len(columns['order_id']):
+            return
+        parts = partition_of(columns['order_id'], len(runs), depth)
+        order = np.argsort(parts, kind='stable')
+        bounds = np.searchsorted(parts[order], np.arange(len(runs) + 1))
+        for i, run in enumerate(runs):
+            rows = order[bounds[i]:bounds[i + 1]]
+            if len(rows):
+                run.write({name: values[rows] for name, values in columns.items()})
+
+    def _sessionize_run(self, run: SpillRun, workdir: str, depth: int) -> Iterator[SessionBatch]:
+        """
+        Sort and group one partition, splitting it again first if it is too big.
+        """
+        if run.rows == 0:
+            os.remove(run.path)
+            return
+        if run.size > self.memory_budget and depth + 1 < MAX_SPILL_DEPTH:
+            subruns = self._open_runs(workdir, f'{os.path.basename(run.path)}.{depth + 1}')
+            for columns in run.read():
+                self._scatter(columns, subruns, depth + 1)
+            for subrun in subruns:
+                subrun.close()
+            os.remove(run.path)
+            for subrun in subruns:
+                yield from self._sessionize_run(subrun, workdir, depth + 1)
+            return
+
+        blocks = list(run.read())
+        os.remove(run.path)
+        columns = {name: np.concatenate([block[name] for block in blocks]) for name in blocks[0]}
+        del blocks
+        yield self._group(columns)
+
+    def _group(self, columns: Dict[str, np.ndarray]) -> SessionBatch:
+        """
+        Turn one partition's events into sessions (same rules as sessionize_data).
+        """
+        # Each order's events end up together, in time order; ties keep arrival order
+        perm = np.lexsort((columns['arrival'], columns['timestamp'], columns['order_id']))
+        sorted_ids = columns['order_id'][perm]
+        starts = np.flatnonzero(np.r_[True, sorted_ids[1:] != sorted_ids[:-1]])
+        codes = columns['event_code'][perm]
+
+        success = self._codes.get(self.success_event, -1)
+        labels = np.logical_or.reduceat(codes == success, starts)
+        provenance = {name: columns[name][perm] for name in PROVENANCE_COLUMNS if name in columns}
+        return SessionBatch(sorted_ids[starts], np.append(starts, len(perm)), codes,
+                            columns['timestamp'][perm], list(self._dictionary), labels, provenance)
@@ -0,0 +1,334 @@
+"""
+Mini-batch training for Project Stressed.
+Feeds the LSTM through a torch DataLoader instead of one full-batch tensor, so
+memory stays bounded by the batch size rather than the dataset size. Encoded
+sessions can also be written once to an on-disk dataset that training jobs
+memory-map instead of loading.
+"""
+
+import json
+import os
+import time
+from typing import Dict, Iterator, Optional, Tuple, Union
+
+import numpy as np
+import torch
+import torch.nn as nn
+import torch.optim as optim
+from torch.utils.data import DataLoader, Dataset, Sampler
+
+from models.records import SessionBatch, pad_rows
+
+
+class SessionDataset(Dataset):
+    """
+    Encoded sessions in CSR form (flat token IDs + offsets + labels).
+
+    Indexed with an array of session positions, it returns a whole padded
+    batch (X, lengths, y): padding happens in the DataLoader workers, with one
+    vectorized scatter per batch instead of one Python call per session.
+    """
+
+    def __init__(self, tokens: np.ndarray, offsets: np.ndarray, labels: np.ndarray, max_len: int):
+        self.tokens = tokens
+        self.offsets = offsets
+        self.labels = labels
+        self.max_len = max_len
+
+    @classmethod
+    def from_batch(cls, sessions: SessionBatch, max_len: int) -> 'SessionDataset':
+        """
+        Dataset over a vectorized SessionBatch (see prepare_vectors).
+        """
+        return cls(sessions.encoded, sessions.offsets, sessions.label, max_len)
+
+    def __len__(self) -> int:
+        return len(self.labels)
+
+    @property
+    def lengths(self) -> np.ndarray:
+        """
+        Length of every session after truncation to max_len.
+        """
+        return np.minimum(np.diff(self.offsets), self.max_len)
+
+    def __getitem__(self, rows) -> Tuple[torch.Tensor, torch.Tensor, torch.Tensor]:
+        rows = np.atleast_1d(np.asarray(rows, dtype=np.int64))
+        lengths = np.minimum(self.offsets[1:][rows] - self.offsets[:-1][rows], self.max_len)
+        width = max(int(lengths.max()) if len(rows) else 0, 1)
+        X = pad_rows(self.tokens, self.offsets, rows, width)
+        y = np.asarray(self.labels[rows], dtype=np.float32)
+        return (torch.from_numpy(X.astype(np.int64, copy=False)), torch.from_numpy(lengths.astype(np.int64)),
+                torch.from_numpy(y).unsqueeze(1))
+
+
+# Version of the checkpoint layout
+CHECKPOINT_FORMAT = 1
+# Mini-batch size when training from an on-disk dataset without an explicit one
+DEFAULT_BATCH_SIZE = 1024
+# Version of the on-disk dataset layout
+DATASET_FORMAT = 1
+_DATASET_ARRAYS = ('tokens', 'offsets', 'labels', 'lengths')
+
+
+def write_session_dataset(sessions: SessionBatch, path: Union[str, os.PathLike], vocab_size: int,
+                          vocabulary_fingerprint: Optional[str] = None) -> Dict:
+    """
+    Write encoded sessions as a directory of .npy files: flat int32 'tokens',
+    int64 'offsets' (n + 1), uint8 'labels' and int32 'lengths', plus a
+    meta.json describing them.
+
+    Args:
+        sessions: SessionBatch with 'encoded' filled in (see prepare_vectors)
+        path: Target directory (created if needed)
+        vocab_size: Embedding size the token IDs need
+        vocabulary_fingerprint: Fingerprint of the vocabulary that produced the IDs
+
+    Returns:
+        The metadata written to meta.json
+    """
+    if sessions.encoded is None:
+        raise ValueError("Sessions are not encoded yet; run prepare_vectors first.")
+    os.makedirs(path, exist_ok=True)
+    arrays = {
+        'tokens': sessions.encoded.astype(np.int32),
+        'offsets': sessions.offsets.astype(np.int64),
+        'labels': sessions.label.astype(np.uint8),
+        'lengths': sessions.lengths.astype(np.int32),
+    }
+    for name, values in arrays.items():
+        np.save(os.path.join(path, f'{name}.npy'), values)
+    meta = {
+        'format': DATASET_FORMAT,
+        'sessions': len(sessions),
+        'events': int(len(sessions.encoded)),
+        'vocab_size': vocab_size,
+        'vocabulary_fingerprint': vocabulary_fingerprint,
+    }
+    # meta.json last: a directory without it is an unfinished write
+    with open(os.path.join(path, 'meta.json'), 'w', encoding='utf-8') as f:
+        json.dump(meta, f, indent=1)
+    return meta
+
+
+def read_dataset_meta(path: Union[str, os.PathLike]) -> Dict:
+    """
+    Metadata of an on-disk dataset written by write_session_dataset.
+    """
+    meta_path = os.path.join(path, 'meta.json')
+    if not os.path.exists(meta_path):
+        raise ValueError(f"{path} is not a session dataset (no meta.json).")
+    with open(meta_path, 'r', encoding='utf-8') as f:
+        meta = json.load(f)
+    if meta.get('format') != DATASET_FORMAT:
+        raise ValueError(f"Unsupported dataset format {meta.get('format')!r} in {path} "
+                         f"(expected {DATASET_FORMAT}).")
+    return meta
+
+
+class MappedSessionDataset(SessionDataset):
+    """
+    SessionDataset over the .npy files of write_session_dataset, opened with
+    mmap: nothing is loaded up front, batches are gathered straight from the
+    mapped pages, and jobs reading the same files share them in the page cache.
+
+    Only the path is pickled, so each DataLoader worker maps the files itself
+    instead of receiving a copy of the arrays.
+    """
+
+    def __init__(self, path: Union[str, os.PathLike], max_len: int):
+        self.path = path
+        self.meta = read_dataset_meta(path)
+        self._open()
+        super().__init__(self.tokens, self.offsets, self.labels, max_len)
+
+    def _open(self):
+        arrays = {name: np.load(os.path.join(self.path, f'{name}.npy'), mmap_mode='r')
+                  for name in _DATASET_ARRAYS}
+        self.tokens, self.offsets, self.labels = arrays['tokens'], arrays['offsets'], arrays['labels']
+        self._lengths = arrays['lengths']
+
+    @property
+    def lengths(self) -> np.ndarray:
+        return np.minimum(self._lengths, self.max_len)
+
+    def __getstate__(self):
+        return {'path': self.path, 'meta': self.meta, 'max_len': self.max_len}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._open()
+
+
+class LengthBucketSampler(Sampler):
+    """
+    Yields batches of session positions, each drawn from sessions of similar
+    length so a batch pads only to its own longest session.
+
+    With shuffle, sessions are shuffled, grouped into pools of pool_batches
+    batches, sorted by length inside each pool, cut into batches, and the
+    batches are shuffled again: batches stay length-homogeneous but differ
+    from epoch to epoch.
+    """
+
+    def __init__(self, lengths: np.ndarray, batch_size: int, shuffle: bool = True,
+                 pool_batches: int = 50, seed: Optional[int] = None):
+        if batch_size <= 0:
+            raise ValueError("batch_size must be a positive integer.")
+        self.lengths = lengths
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.pool_batches = pool_batches
+        self._rng = np.random.default_rng(seed)
+
+    def __len__(self) -> int:
+        return -(-len(self.lengths) // self.batch_size)
+
+    def __iter__(self) -> Iterator[np.ndarray]:
+        if not self.shuffle:
+            order = np.argsort(self.lengths, kind='stable')
+            yield from (order[i:i + self.batch_size] for i in range(0, len(order), self.batch_size))
+            return
+
+        order = self._rng.permutation(len(self.lengths))
+        pool = self.batch_size * self.pool_batches
+        batches = []
+        for i in range(0, len(order), pool):
+            chunk = order[i:i + pool]
+            chunk = chunk[np.argsort(self.lengths[chunk], kind='stable')]
+            batches.extend(chunk[j:j + self.batch_size] for j in range(0, len(chunk), self.batch_size))
+        for k in self._rng.permutation(len(batches)):
+            yield batches[k]
+
+
+def session_loader(dataset: SessionDataset, batch_size: int, shuffle: bool = True, loader_workers: int = 0,
+                   pin_memory: Optional[bool] = None, seed: Optional[int] = None) -> DataLoader:
+    """
+    DataLoader over a SessionDataset yielding padded (X, lengths, y) batches.
+
+    Args:
+        dataset: Sessions to train on
+        batch_size: Sessions per batch
+        shuffle: Reshuffle the batches every epoch
+        loader_workers: DataLoader worker processes that build batches
+                        (0 = in the training process, as in torch's num_workers;
+                        unlike the ETL's workers, where 1 means serial)
+        pin_memory: Page-locked batch buffers for faster host-to-GPU copies
+                    (default: only when CUDA is available)
+        seed: Seed of the shuffling
+
+    Returns:
+        DataLoader
+    """
+    if pin_memory is None:
+        pin_memory = torch.cuda.is_available()
+    sampler = LengthBucketSampler(dataset.lengths, batch_size, shuffle=shuffle, seed=seed)
+    # batch_size=None: the sampler already yields whole batches, the dataset pads them
+    return DataLoader(dataset, sampler=sampler, batch_size=None, num_workers=loader_workers,
+                      pin_memory=pin_memory, persistent_workers=loader_workers > 0)
+
+
+def grow_optimizer_state(optimizer: optim.Optimizer, param: torch.Tensor):
+    """
+    Pad the per-element optimizer state of a parameter that gained rows (see
+    RCA_LSTM.grow_embedding) with zeros, as if the new rows had never been
+    updated. State of the existing rows is kept.
+    """
+    state = optimizer.state.get(param)
+    if not state:
+        return
+    for name, value in state.items():
+        if torch.is_tensor(value) and value.dim() == param.dim() and value.shape[0] < param.shape[0]:
+            padding = value.new_zeros((param.shape[0] - value.shape[0],) + tuple(value.shape[1:]))
+            state[name] = torch.cat([value, padding])
+
+
+def train_minibatch(model: nn.Module, loader: DataLoader, epochs: int = 10, lr: float = 0.01,
+                    optimizer: Optional[optim.Optimizer] = None) -> Dict:
+    """
+    Mini-batch training loop: one optimizer step per batch.
+
+    Args:
+        model: RCA_LSTM (or any module taking (X, lengths))
+        loader: Batches from session_loader
+        epochs: Passes over the data
+        lr: Adam learning rate (for a new optimizer)
+        optimizer: Optimizer to continue with (e.g. from a checkpoint), instead of a new Adam
+
+    Returns:
+        Stats: final 'loss', 'samples', 'seconds' and 'samples_per_sec'
+    """
+    criterion = nn.BCELoss(reduction='sum')
+    if optimizer is None:
+        optimizer = optim.Adam(model.parameters(), lr=lr)
+    device = next(model.parameters()).device
+    model.train()
+
+    samples, loss, start = 0, 0.0, time.perf_counter()
+    for epoch in range(epochs):
+        epoch_loss, epoch_samples, epoch_start = 0.0, 0, time.perf_counter()
+        for X, lengths, y in loader:
+            X, y = X.to(device, non_blocking=True), y.to(device, non_blocking=True)
+            optimizer.zero_grad()
+            batch_loss = criterion(model(X, lengths), y)
+            (batch_loss / len(y)).backward()
+            optimizer.step()
+            epoch_loss += batch_loss.item()
+            epoch_samples += len(y)
+        samples += epoch_samples
+        loss = epoch_loss / max(epoch_samples, 1)
+        rate = epoch_samples / max(time.perf_counter() - epoch_start, 1e-9)
+        print(f"Epoch {epoch}: Loss {loss:.4f} ({rate:,.0f} samples/sec)")
+
+    seconds = time.perf_counter() - start
+    return {'loss': loss, 'samples': samples, 'seconds': seconds,
+            'samples_per_sec': samples / max(seconds, 1e-9)}
+
+
+def model_config(model: nn.Module) -> Dict:
+    """
+    Constructor arguments of an RCA_LSTM, read back from its layers.
+    """
+    return {
+        'vocab_size': model.embedding.num_embeddings,
+        'embedding_dim': model.embedding.embedding_dim,
+        'hidden_dim': model.lstm.hidden_size,
+        'output_dim': model.fc.out_features,
+    }
+
+
+def save_checkpoint(path: Union[str, os.PathLike], model: nn.Module, optimizer: Optional[optim.Optimizer],
+                    vocabulary: Dict, **extra):
+    """
+    Save everything needed to resume training: model weights and shape,
+    optimizer state and the vocabulary the token IDs refer to.
+
+    Args:
+        path: Target file
+        model: Trained RCA_LSTM
+        optimizer: Its optimizer (None to save weights only)
+        vocabulary: {'event_to_id', 'hash_buckets', 'fingerprint'}
+        **extra: Other values to store (e.g. max_seq_len, training stats)
+    """
+    torch.save({
+        'format': CHECKPOINT_FORMAT,
+        'model_config': model_config(model),
+        'model': model.state_dict(),
+        'optimizer': optimizer.state_dict() if optimizer is not None else None,
+        'vocabulary': vocabulary,
+        **extra,
+    }, path)
+
+
+def load_checkpoint(path: Union[str, os.PathLike]) -> Dict:
+    """
+    Read a checkpoint written by save_checkpoint.
+
+    Raises:
+        ValueError: Unknown checkpoint format
+    """
+    checkpoint = torch.load(path, map_location='cpu', weights_only=True)
+    if checkpoint.get('format') != CHECKPOINT_FORMAT:
+        raise ValueError(f"Unsupported checkpoint format {checkpoint.get('format')!r} in {path} "
+                         f"(expected {CHECKPOINT_FORMAT}).")
+    return checkpoint
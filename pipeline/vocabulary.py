@@ -0,0 +1,145 @@
+"""
+Event vocabulary helpers for Project Stressed.
+Besides the learned vocabulary (one ID per event name seen so far), events
+can be mapped by feature hashing: a stable hash into a fixed number of
+buckets, so encoding needs no global pass and the model size never changes.
+"""
+
+import hashlib
+import json
+import os
+from typing import Dict, Iterable, Optional, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+# IDs 0 (<PAD>) and 1 (<UNK>) are reserved; hash buckets start after them
+RESERVED_IDS = 2
+
+# Hash function behind stable_event_hash (part of a hashed vocabulary's fingerprint)
+HASH_SCHEME = 'blake2b-8'
+
+# Version of the saved vocabulary file layout
+VOCABULARY_FORMAT = 1
+
+
+def stable_event_hash(event: str) -> int:
+    """
+    64-bit hash of an event name that is the same in every process and run
+    (unlike the built-in hash(), which is salted per process).
+    """
+    return int.from_bytes(hashlib.blake2b(event.encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+def hashed_ids(events: Iterable[str], num_buckets: int) -> np.ndarray:
+    """
+    Map event names to IDs in [RESERVED_IDS, RESERVED_IDS + num_buckets).
+    Called on a dictionary (one entry per distinct name), not on every event.
+
+    Args:
+        events: Event names
+        num_buckets: Number of hash buckets
+
+    Returns:
+        int64 array of IDs, aligned with events
+    """
+    return np.fromiter((RESERVED_IDS + stable_event_hash(event) % num_buckets for event in events), dtype=np.int64)
+
+
+def collision_report(event_to_id: Dict[str, int], num_buckets: int) -> Dict:
+    """
+    Summarise how hashed event names share buckets.
+
+    Args:
+        event_to_id: Event name -> hashed ID, for every event seen
+        num_buckets: Number of hash buckets
+
+    Returns:
+        Dict with 'events', 'buckets', 'buckets_used', 'colliding_events',
+        'collision_rate' (share of events that share their bucket) and
+        'collisions' (DataFrame of the shared buckets and their events)
+    """
+    events = {name: idx for name, idx in event_to_id.items() if idx >= RESERVED_IDS}
+    frame = pd.DataFrame({'Bucket ID': list(events.values()), 'Event': list(events)})
+    groups = frame.groupby('Bucket ID')['Event'].agg(sorted)
+    shared = groups[groups.map(len) > 1]
+    colliding = int(shared.map(len).sum())
+    collisions = pd.DataFrame({'Bucket ID': shared.index, 'Events': shared.values,
+                               'Count': shared.map(len).values})
+    return {
+        'events': len(events),
+        'buckets': num_buckets,
+        'buckets_used': len(groups),
+        'colliding_events': colliding,
+        'collision_rate': colliding / len(events) if events else 0.0,
+        'collisions': collisions.sort_values('Count', ascending=False, kind='stable').reset_index(drop=True),
+    }
+
+
+def vocabulary_fingerprint(event_to_id: Dict[str, int], hash_buckets: Optional[int] = None) -> str:
+    """
+    Content hash of a vocabulary: equal fingerprints mean identical event -> ID
+    mappings, so a model trained with one can safely be fed IDs from the other.
+    A hashed vocabulary's mapping is fixed by its hash scheme and bucket count
+    alone, so the names seen so far are left out of its fingerprint.
+    """
+    if hash_buckets:
+        content = {'scheme': HASH_SCHEME, 'offset': RESERVED_IDS, 'hash_buckets': hash_buckets}
+    else:
+        content = {'event_to_id': event_to_id, 'hash_buckets': hash_buckets}
+    canonical = json.dumps(content, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+def save_vocabulary(path: Union[str, os.PathLike], event_to_id: Dict[str, int],
+                    hash_buckets: Optional[int] = None) -> str:
+    """
+    Write a vocabulary to a JSON file, stamped with the format version and
+    its fingerprint.
+
+    Args:
+        path: Target file
+        event_to_id: Event name -> ID
+        hash_buckets: Bucket count if the IDs come from feature hashing
+
+    Returns:
+        The vocabulary fingerprint
+    """
+    fingerprint = vocabulary_fingerprint(event_to_id, hash_buckets)
+    payload = {
+        'format': VOCABULARY_FORMAT,
+        'fingerprint': fingerprint,
+        'hash_buckets': hash_buckets,
+        'event_to_id': event_to_id,
+    }
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(payload, f, indent=1, sort_keys=True)
+    return fingerprint
+
+
+def load_vocabulary(path: Union[str, os.PathLike]) -> Tuple[Dict[str, int], Optional[int], str]:
+    """
+    Read a vocabulary written by save_vocabulary and check its stamp.
+
+    Args:
+        path: Vocabulary file
+
+    Returns:
+        (event_to_id, hash_buckets, fingerprint)
+
+    Raises:
+        ValueError: Unknown format version, or content that does not match its fingerprint
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        payload = json.load(f)
+    if payload.get('format') != VOCABULARY_FORMAT:
+        raise ValueError(f"Unsupported vocabulary format {payload.get('format')!r} in {path} "
+                         f"(expected {VOCABULARY_FORMAT}).")
+    event_to_id, hash_buckets = payload['event_to_id'], payload['hash_buckets']
+    fingerprint = vocabulary_fingerprint(event_to_id, hash_buckets)
+    if fingerprint != payload['fingerprint']:
+        raise ValueError(f"Vocabulary file {path} does not match its fingerprint (modified or corrupt).")
+    hashed = {name: idx for name, idx in event_to_id.items() if idx >= RESERVED_IDS}
+    if hash_buckets and np.any(hashed_ids(hashed, hash_buckets) != list(hashed.values())):
+        raise ValueError(f"Vocabulary file {path} has IDs that do not match its hash buckets (modified or corrupt).")
+    return event_to_id, hash_buckets, fingerprint
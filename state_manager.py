@@ -7,7 +7,7 @@ def init_session_state():
     if 'current_step' not in st.session_state:
         st.session_state.current_step = 1
     if 'raw_logs' not in st.session_state:
-        st.session_state.raw_logs = []
+        st.session_state.raw_logs = None
     if 'df_events' not in st.session_state:
         st.session_state.df_events = None
     if 'df_sessions' not in st.session_state:
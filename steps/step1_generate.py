@@ -53,13 +53,13 @@ for step in workflow_steps[:cutoff]:
     
     if st.button("Generate Logs", help="Click to run the simulation engine."):
         with st.spinner("Generating logs..."):
-            st.session_state.raw_logs = st.session_state.facade.generate_synthetic_logs(num_orders=num_orders)
+            st.session_state.raw_logs = st.session_state.facade.generate_synthetic_logs(num_orders=num_orders, packed=True)
             time.sleep(0.5)
-            st.success(f"Generated {len(st.session_state.raw_logs)} log lines.")
+            st.success(f"Generated {st.session_state.raw_logs.line_count} log lines.")
     
     if st.session_state.raw_logs:
         st.subheader("Raw Log Preview")
-        st.text_area("Logs", "\n".join(st.session_state.raw_logs[:20]) + "\n...", height=300)
+        st.text_area("Logs", "\n".join(st.session_state.raw_logs.head(20)) + "\n...", height=300)
         
         if st.button("Next: Run ETL"):
             st.session_state.current_step = 2
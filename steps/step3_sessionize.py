@@ -54,7 +54,7 @@ def render_step3():
     
     if st.session_state.df_sessions is not None:
         st.subheader("User Journeys")
-        st.dataframe(st.session_state.df_sessions[['order_id', 'event_name', 'label']].head(20))
+        st.dataframe(st.session_state.df_sessions.head(20)[['order_id', 'event_name', 'label']])
         
         if st.button("Next: Vectorize"):
             st.session_state.current_step = 4
@@ -60,10 +60,10 @@ def render_step4():
         col1, col2 = st.columns(2)
         with col1:
             st.markdown("**Human Readable (Text)**")
-            st.write(st.session_state.df_ready['event_name'].iloc[0])
+            st.write(st.session_state.df_ready.session(0)['event_name'])
         with col2:
             st.markdown("**Machine Readable (Vector)**")
-            st.write(st.session_state.df_ready['encoded'].iloc[0])
+            st.write(st.session_state.df_ready.session(0)['encoded'])
         
         st.subheader("Vocabulary Map")
         vocab = st.session_state.facade.get_vocabulary()
@@ -206,7 +206,7 @@ def render_step6():
     """, unsafe_allow_html=True)
     
     st.info("👇 Select an order to trace its exact path through the system.")
-    order_id = st.selectbox("Select Order ID to Inspect", st.session_state.df_ready['order_id'].unique())
+    order_id = st.selectbox("Select Order ID to Inspect", st.session_state.df_ready.order_id)
     
     if order_id:
         details = st.session_state.facade.get_order_details(st.session_state.df_ready, order_id)
@@ -264,7 +264,7 @@ def render_step6():
 
     if st.button("Restart Analysis"):
         st.session_state.current_step = 1
-        st.session_state.raw_logs = []
+        st.session_state.raw_logs = None
         st.session_state.df_events = None
         st.session_state.df_sessions = None
         st.session_state.df_ready = None
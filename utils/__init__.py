@@ -1,5 +1,12 @@
 """Utilities package for Project Stressed."""
 
 from .data_generator import generate_messy_logs
+from .log_sources import (iter_log_lines, iter_chunks, open_log_file, expand_log_paths,
+                          LogBuffer, MappedLogFile, LogFileRef)
+from .timestamps import MISSING_TIMESTAMP, to_epoch, parse_timestamp, format_timestamp
 
-__all__ = ['generate_messy_logs']
+__all__ = [
+    'generate_messy_logs', 'iter_log_lines', 'iter_chunks', 'open_log_file', 'expand_log_paths',
+    'LogBuffer', 'MappedLogFile', 'LogFileRef',
+    'MISSING_TIMESTAMP', 'to_epoch', 'parse_timestamp', 'format_timestamp',
+]
@@ -0,0 +1,294 @@
+"""
+Log input sources for Project Stressed.
+Turns files and iterators into lazy streams of lines, so the pipeline never
+needs the whole log in memory at once.
+"""
+
+import glob
+import gzip
+import mmap
+import os
+from itertools import islice
+from typing import Iterable, Iterator, List, Tuple, Union
+
+LogSource = Union[str, os.PathLike, Iterable[str]]
+
+
+def iter_log_lines(source: LogSource) -> Iterator[str]:
+    """
+    Yield log lines one at a time from a file path or any iterable of strings.
+    Trailing newlines are stripped; the file is read lazily and closed at the end.
+
+    Args:
+        source: Path to a log file, or an iterable/iterator of raw log strings
+
+    Returns:
+        Iterator over raw log strings
+    """
+    if isinstance(source, (str, os.PathLike)):
+        with open_log_file(source) as f:
+            for line in f:
+                yield line.rstrip('\r\n')
+    else:
+        for line in source:
+            yield line.rstrip('\r\n')
+
+
+def open_log_file(path: Union[str, os.PathLike]):
+    """
+    Open a plain or gzip-compressed log file for reading text.
+    Rotated logs ('app.log.3.gz') are recognised by their gzip magic bytes,
+    not only by extension.
+
+    Args:
+        path: Path to the log file
+
+    Returns:
+        A text file object (use it as a context manager)
+    """
+    with open(path, 'rb') as probe:
+        is_gzip = probe.read(2) == b'\x1f\x8b'
+    if is_gzip:
+        return gzip.open(path, 'rt', encoding='utf-8', errors='replace')
+    return open(path, 'r', encoding='utf-8', errors='replace')
+
+
+def open_log_bytes(path: Union[str, os.PathLike]):
+    """
+    Same as open_log_file, but in binary mode (gzip content is decompressed).
+    Byte offsets into this stream are what provenance references point at.
+    """
+    with open(path, 'rb') as probe:
+        is_gzip = probe.read(2) == b'\x1f\x8b'
+    return gzip.open(path, 'rb') if is_gzip else open(path, 'rb')
+
+
+def iter_byte_chunks(path: Union[str, os.PathLike], chunk_size: int) -> Iterator[Tuple[int, bytes]]:
+    """
+    Read a (plain or gzip) file in chunks of at most chunk_size lines, as bytes.
+
+    Args:
+        path: Path to the log file
+        chunk_size: Maximum lines per chunk
+
+    Returns:
+        Iterator over (byte offset of the chunk in the file, chunk bytes)
+    """
+    offset = 0
+    with open_log_bytes(path) as f:
+        for lines in iter_chunks(f, chunk_size):
+            data = b''.join(lines)
+            yield offset, data
+            offset += len(data)
+
+
+def expand_log_paths(patterns: Union[str, Iterable[str]]) -> List[str]:
+    """
+    Expand one or more glob patterns (e.g. 'logs/api/*.log*') into a sorted,
+    de-duplicated list of files.
+
+    Args:
+        patterns: A glob pattern or a list of patterns/paths
+
+    Returns:
+        Sorted list of matching file paths
+    """
+    if isinstance(patterns, (str, os.PathLike)):
+        patterns = [patterns]
+    paths = set()
+    for pattern in patterns:
+        paths.update(p for p in glob.glob(os.fspath(pattern), recursive=True) if os.path.isfile(p))
+    return sorted(paths)
+
+
+def iter_chunks(lines: Iterable[str], chunk_size: int) -> Iterator[List[str]]:
+    """
+    Group a stream of lines into lists of at most chunk_size lines.
+
+    Args:
+        lines: Any iterable of raw log strings
+        chunk_size: Maximum lines per chunk
+
+    Returns:
+        Iterator over lists of lines
+    """
+    if chunk_size <= 0:
+        raise ValueError("chunk_size must be a positive integer.")
+    iterator = iter(lines)
+    while True:
+        chunk = list(islice(iterator, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+class LogBuffer:
+    """
+    Newline-separated UTF-8 log lines held in ONE bytes buffer.
+
+    Parsers scan the buffer as bytes and every event refers back to its line
+    by (offset, length) instead of keeping a copy of the text. A line is only
+    decoded when someone asks to see it (read_line).
+    """
+
+    def __init__(self, buffer: bytes):
+        self.buffer = buffer
+        self._line_count = None
+
+    @classmethod
+    def from_lines(cls, lines: Iterable[str]) -> 'LogBuffer':
+        """
+        Pack a list of log strings into one compact UTF-8 buffer.
+
+        Args:
+            lines: Raw log strings (must not contain newlines themselves)
+
+        Returns:
+            LogBuffer holding the lines
+        """
+        lines = lines if isinstance(lines, list) else list(lines)
+        buffer = cls('\n'.join(lines).encode('utf-8', errors='replace'))
+        if lines and buffer.buffer.count(b'\n') != len(lines) - 1:
+            raise ValueError("Log lines must not contain embedded newlines.")
+        buffer._line_count = len(lines)
+        return buffer
+
+    def __len__(self) -> int:
+        return len(self.buffer)
+
+    @property
+    def line_count(self) -> int:
+        """
+        Number of lines in the buffer.
+        """
+        if self._line_count is None:
+            size = len(self.buffer)
+            newlines = self.buffer.count(b'\n')
+            # A trailing newline does not start another line
+            self._line_count = newlines + (1 if size and self.buffer[size - 1:size] != b'\n' else 0)
+        return self._line_count
+
+    def head(self, n: int) -> List[str]:
+        """
+        Decode the first n lines (for previews).
+        """
+        lines, start = [], 0
+        while len(lines) < n and start < len(self.buffer):
+            newline = self.buffer.find(b'\n', start)
+            end = len(self.buffer) if newline < 0 else newline
+            lines.append(self.read_line(start, end - start))
+            start = end + 1
+        return lines
+
+    def read_line(self, offset: int, length: int) -> str:
+        """
+        Decode one line on demand from its (offset, length) reference.
+
+        Args:
+            offset: Byte offset of the line start
+            length: Line length in bytes (without the newline)
+
+        Returns:
+            The line as text
+        """
+        return self.buffer[offset:offset + length].decode('utf-8', errors='replace')
+
+    def read_lines(self, refs: Iterable[Tuple[int, int]]) -> List[str]:
+        """
+        Decode several lines from their (offset, length) references, in the given order.
+        """
+        return [self.read_line(offset, length) for offset, length in refs]
+
+    def line_aligned_ranges(self, num_ranges: int) -> List[Tuple[int, int]]:
+        """
+        Split the buffer into about num_ranges byte ranges that start and end on
+        line boundaries, so each can be parsed independently.
+
+        Args:
+            num_ranges: Desired number of ranges
+
+        Returns:
+            List of (start, end) byte offsets covering the whole buffer
+        """
+        size = len(self.buffer)
+        if size == 0:
+            return []
+        step = max(1, size // max(1, num_ranges))
+        ranges = []
+        start = 0
+        while start < size:
+            cut = min(size, start + step)
+            if cut < size:
+                newline = self.buffer.find(b'\n', cut)
+                cut = size if newline < 0 else newline + 1
+            ranges.append((start, cut))
+            start = cut
+        return ranges
+
+
+class MappedLogFile(LogBuffer):
+    """
+    A log file exposed as a read-only memory map.
+
+    Nothing is read up front: the OS pages the file in on demand and keeps it
+    in the page cache, shared between processes.
+    """
+
+    def __init__(self, path: Union[str, os.PathLike]):
+        self.path = os.fspath(path)
+        self._file = open(self.path, 'rb')
+        size = os.fstat(self._file.fileno()).st_size
+        # mmap cannot map an empty file; an empty bytes object behaves the same
+        super().__init__(mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else b'')
+
+    def __enter__(self) -> 'MappedLogFile':
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        """
+        Release the mapping and the file handle.
+        """
+        if isinstance(self.buffer, mmap.mmap):
+            self.buffer.close()
+        self._file.close()
+
+
+class LogFileRef:
+    """
+    A reference to a log file on disk (plain or gzip) that is NOT kept in memory.
+    Lines are read back by (offset, length) into the decompressed content,
+    only when they are displayed.
+    """
+
+    def __init__(self, path: Union[str, os.PathLike]):
+        self.path = os.fspath(path)
+
+    def read_line(self, offset: int, length: int) -> str:
+        """
+        Read one line from disk by its (offset, length) reference.
+        """
+        return self.read_lines([(offset, length)])[0]
+
+    def read_lines(self, refs: Iterable[Tuple[int, int]]) -> List[str]:
+        """
+        Read several lines by their (offset, length) references, in the given order.
+        The file is opened once and read front to back: seeking backwards in a
+        gzip stream would decompress it again from the start.
+
+        Args:
+            refs: (offset, length) pairs into the decompressed content
+
+        Returns:
+            The lines as text
+        """
+        refs = list(refs)
+        lines = [None] * len(refs)
+        with open_log_bytes(self.path) as f:
+            for i in sorted(range(len(refs)), key=lambda i: refs[i][0]):
+                offset, length = refs[i]
+                f.seek(offset)
+                lines[i] = f.read(length).decode('utf-8', errors='replace')
+        return lines
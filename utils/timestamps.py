@@ -0,0 +1,97 @@
+"""
+Timestamp handling for Project Stressed.
+Timestamps are parsed ONCE, at ingest, into int64 seconds since the Unix epoch
+(UTC, naive log times taken as-is). Everything downstream sorts and compares
+plain integers instead of re-parsing strings.
+"""
+
+from datetime import datetime, timedelta
+from typing import Iterable, Optional
+
+import numpy as np
+
+# Log lines carry second resolution: "[YYYY-MM-DD HH:MM:SS]"
+EPOCH_UNIT = 's'
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# The value stored when a line has no (valid) timestamp.
+# It is the int64 bit pattern of NaT, so a datetime64 view shows it as NaT,
+# and it sorts before every real timestamp.
+MISSING_TIMESTAMP = int(np.datetime64('NaT', EPOCH_UNIT).view(np.int64))
+
+# parse_timestamp's fast path for the log format itself
+_TIMESTAMP_LENGTH = len("YYYY-MM-DD HH:MM:SS")
+_EPOCH = datetime(1970, 1, 1)
+_SECOND = timedelta(seconds=1)
+
+
+def to_epoch(values: Iterable) -> np.ndarray:
+    """
+    Convert a column of timestamps to int64 epoch seconds in one vectorized pass.
+    The fast path is NumPy's fixed ISO-8601 parser ("YYYY-MM-DD HH:MM:SS");
+    no format inference is involved. None becomes MISSING_TIMESTAMP, and ints
+    (already epoch seconds) pass through.
+
+    Args:
+        values: Timestamp strings, epoch ints and/or None
+
+    Returns:
+        int64 array of epoch seconds
+    """
+    values = np.asarray(values)
+    if values.dtype.kind in 'iu':
+        return values.astype(np.int64, copy=False)
+    if values.dtype.kind == 'M':
+        return values.astype(f'datetime64[{EPOCH_UNIT}]').view(np.int64)
+
+    try:
+        return values.astype(object).astype(f'datetime64[{EPOCH_UNIT}]').view(np.int64)
+    except ValueError:
+        # A malformed value (e.g. month 13) fails the whole batch; redo it per value
+        return np.fromiter((parse_timestamp(v) for v in values.ravel()), dtype=np.int64, count=values.size)
+
+
+def parse_timestamp(value) -> int:
+    """
+    Convert one timestamp (string, epoch int or None) to epoch seconds.
+    Anything that cannot be parsed becomes MISSING_TIMESTAMP.
+
+    Args:
+        value: Timestamp string, epoch int, or None
+
+    Returns:
+        Epoch seconds
+    """
+    if value is None:
+        return MISSING_TIMESTAMP
+    if isinstance(value, (int, np.integer)):
+        return int(value)
+    try:
+        if isinstance(value, str) and len(value) == _TIMESTAMP_LENGTH:
+            # One line at a time, datetime's ISO parser is about twice as fast as NumPy's
+            return (datetime.fromisoformat(value) - _EPOCH) // _SECOND
+        return int(np.datetime64(value, EPOCH_UNIT).view(np.int64))
+    except ValueError:
+        return MISSING_TIMESTAMP
+
+
+def format_timestamp(epoch: int) -> Optional[str]:
+    """
+    Render epoch seconds in the log format, e.g. for display.
+
+    Args:
+        epoch: Epoch seconds
+
+    Returns:
+        "YYYY-MM-DD HH:MM:SS", or None for MISSING_TIMESTAMP
+    """
+    if epoch == MISSING_TIMESTAMP:
+        return None
+    return str(np.datetime64(int(epoch), EPOCH_UNIT)).replace('T', ' ')
+
+
+def as_datetime64(epochs: np.ndarray) -> np.ndarray:
+    """
+    Zero-copy datetime64 view of an epoch column (MISSING_TIMESTAMP shows as NaT).
+    """
+    return np.asarray(epochs, dtype=np.int64).view(f'datetime64[{EPOCH_UNIT}]')